@@ -3,9 +3,11 @@ from flask_pymongo import PyMongo
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
+from mongo_pool import PoolMonitor, pool_options
 import os
 
 mongo = PyMongo()
+pool_monitor = PoolMonitor()
 cors = CORS()
 jwt = JWTManager()
 
@@ -18,8 +20,12 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key')
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-dev-key')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600
+    app.config['MONGO_MAX_POOL_SIZE'] = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+    app.config['MONGO_MIN_POOL_SIZE'] = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+    app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'] = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+    app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
     
-    mongo.init_app(app)
+    mongo.init_app(app, event_listeners=[pool_monitor], **pool_options(app.config))
     cors.init_app(app)
     jwt.init_app(app)
     
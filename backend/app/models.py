@@ -2,6 +2,7 @@
 from datetime import datetime
 import uuid
 from bson import ObjectId
+from app.utils.exchange_rates import CURRENCY_SYMBOLS, rates
 
 class ProductSchema:
     """Product schema definition for MongoDB"""
@@ -87,44 +88,41 @@ class UserSchema:
 class CurrencyManager:
     """Manage currency conversions (same as before but adapted for MongoDB)"""
     
-    # Exchange rates (approximate)
-    EXCHANGE_RATES = {
-        'USD': 1.0,
-        'KES': 128.5,      # Kenyan Shilling
-        'UGX': 3582.34,    # Ugandan Shilling
-        'BIF': 2850.0,     # Burundi Franc
-        'CDF': 2700.0      # Congolese Franc
-    }
-    
-    CURRENCY_SYMBOLS = {
-        'KES': 'KSh',
-        'UGX': 'USh',
-        'BIF': 'FBu',
-        'CDF': 'FC',
-        'USD': '$'
-    }
+    # Rates live in the shared exchange-rate service
+    CURRENCY_SYMBOLS = CURRENCY_SYMBOLS
     
     @classmethod
     def convert_price(cls, amount_usd, target_currency):
         """Convert USD amount to target currency"""
-        currency = target_currency.upper()
-        if currency not in cls.EXCHANGE_RATES:
-            raise ValueError(f"Unsupported currency: {currency}")
-        
-        rate = cls.EXCHANGE_RATES[currency]
-        return round(amount_usd * rate, 2)
+        return rates.convert(amount_usd, 'USD', target_currency.upper())
+    
+    @classmethod
+    def convert(cls, amount, from_currency, to_currency):
+        """Convert between any two supported currencies"""
+        return rates.convert(amount, from_currency.upper(), to_currency.upper())
+    
+    @classmethod
+    def get_rate(cls, from_currency, to_currency):
+        """Units of to_currency per unit of from_currency"""
+        return rates.rate(from_currency.upper(), to_currency.upper())
+    
+    @classmethod
+    def get_currency_symbol(cls, currency_code):
+        """Get currency symbol"""
+        return cls.CURRENCY_SYMBOLS.get(currency_code, currency_code)
     
     @classmethod
     def get_all_prices(cls, amount_usd):
         """Get prices in all supported currencies"""
+        currencies = [c for c in rates.currencies if c != 'USD']
+        amounts = rates.price_table([amount_usd], currencies)[0]
         prices = {}
-        for currency, rate in cls.EXCHANGE_RATES.items():
-            if currency != 'USD':
-                prices[currency] = {
-                    'amount': round(amount_usd * rate, 2),
-                    'rate': rate,
-                    'symbol': cls.CURRENCY_SYMBOLS.get(currency, currency)
-                }
+        for currency, amount in zip(currencies, amounts):
+            prices[currency] = {
+                'amount': round(float(amount), 2),
+                'rate': rates.rate('USD', currency),
+                'symbol': cls.CURRENCY_SYMBOLS.get(currency, currency)
+            }
         return prices
     
     @classmethod
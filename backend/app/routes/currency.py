@@ -94,16 +94,11 @@ def convert_price():
     from_currency = request.args.get('from', 'USD').upper()
     to_currency = request.args.get('to', 'KES').upper()
     
-    # First convert to USD if not already USD
-    if from_currency != 'USD':
-        # In real implementation, use proper conversion
-        # This is simplified
-        amount_usd = amount / CurrencyManager.DEFAULT_EXCHANGE_RATES.get(from_currency, 1)
-    else:
-        amount_usd = amount
-    
-    # Convert to target currency
-    converted = CurrencyManager.convert_price(amount_usd, to_currency)
+    # Any-to-any conversion through the cross-rate matrix
+    try:
+        converted = CurrencyManager.convert(amount, from_currency, to_currency)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     
     return jsonify({
         'status': 'success',
@@ -117,5 +112,5 @@ def convert_price():
             'currency': to_currency,
             'symbol': CurrencyManager.get_currency_symbol(to_currency)
         },
-        'exchange_rate': CurrencyManager.DEFAULT_EXCHANGE_RATES.get(to_currency, 1)
+        'exchange_rate': CurrencyManager.get_rate(from_currency, to_currency)
     })
\ No newline at end of file
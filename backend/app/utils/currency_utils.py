@@ -1,63 +1,53 @@
 # app/utils/currency_utils.py
-import requests
 from flask import current_app
 from datetime import datetime, timedelta
+from app.utils.exchange_rates import CURRENCY_SYMBOLS, rates
 
 class CurrencyManager:
     """Manage currency conversions and exchange rates"""
     
-    # Static exchange rates (update these regularly via API)
-    # Based on Trading Economics data for UGX[citation:9]
-    DEFAULT_EXCHANGE_RATES = {
-        'USD': 1.0,
-        'KES': 128.5,      # Kenyan Shilling (approx)
-        'UGX': 3582.34,    # Ugandan Shilling[citation:9]
-        'BIF': 2850.0,     # Burundi Franc (approx)
-        'CDF': 2700.0      # Congolese Franc (approx)
-    }
-    
     @classmethod
     def convert_price(cls, amount_usd, target_currency):
         """Convert USD amount to target currency"""
-        if target_currency.upper() not in cls.DEFAULT_EXCHANGE_RATES:
-            raise ValueError(f"Unsupported currency: {target_currency}")
-        
-        rate = cls.DEFAULT_EXCHANGE_RATES[target_currency.upper()]
-        return round(amount_usd * rate, 2)
+        return rates.convert(amount_usd, 'USD', target_currency.upper())
+    
+    @classmethod
+    def convert(cls, amount, from_currency, to_currency):
+        """Convert between any two supported currencies"""
+        return rates.convert(amount, from_currency.upper(), to_currency.upper())
+    
+    @classmethod
+    def get_rate(cls, from_currency, to_currency):
+        """Units of to_currency per unit of from_currency"""
+        return rates.rate(from_currency.upper(), to_currency.upper())
     
     @classmethod
     def get_all_prices(cls, amount_usd):
         """Get prices in all supported currencies"""
+        currencies = [c for c in rates.currencies if c != 'USD']
+        amounts = rates.price_table([amount_usd], currencies)[0]
         prices = {}
-        for currency, rate in cls.DEFAULT_EXCHANGE_RATES.items():
-            if currency != 'USD':
-                prices[currency] = {
-                    'amount': round(amount_usd * rate, 2),
-                    'rate': rate,
-                    'symbol': cls.get_currency_symbol(currency)
-                }
+        for currency, amount in zip(currencies, amounts):
+            prices[currency] = {
+                'amount': round(float(amount), 2),
+                'rate': rates.rate('USD', currency),
+                'symbol': cls.get_currency_symbol(currency)
+            }
         return prices
     
     @classmethod
     def get_currency_symbol(cls, currency_code):
         """Get currency symbol"""
-        symbols = {
-            'KES': 'KSh',
-            'UGX': 'USh',
-            'BIF': 'FBu',
-            'CDF': 'FC',
-            'USD': '$'
-        }
-        return symbols.get(currency_code, currency_code)
+        return CURRENCY_SYMBOLS.get(currency_code, currency_code)
     
     @classmethod
     def update_exchange_rates(cls):
-        """Update exchange rates from API"""
-        try:
-            # This would call a real API - using static data for now
-            # response = requests.get(current_app.config['CURRENCY_API_URL'])
-            # data = response.json()
-            # Update DEFAULT_EXCHANGE_RATES with real data
-            pass
-        except Exception as e:
-            current_app.logger.error(f"Failed to update exchange rates: {e}")
\ No newline at end of file
+        """Update exchange rates from API through the app's refresher, which persists and reprices"""
+        refresher = current_app.extensions.get('rate_refresher')
+        if refresher is None:
+            current_app.logger.error("Failed to update exchange rates: no rate refresher registered")
+            return False
+        if not refresher.refresh(force=True):
+            current_app.logger.error(f"Failed to update exchange rates: {refresher.last_error}")
+            return False
+        return True
\ No newline at end of file
@@ -0,0 +1,126 @@
+# app/utils/exchange_rates.py
+"""Single source of exchange rates for every backend.
+
+Rates are held as units of each currency per 1 USD and expanded into an N x N
+cross-rate matrix, so converting between any two supported currencies is one
+lookup, and converting many amounts between many pairs is one vectorized NumPy
+operation. The current snapshot is an immutable object swapped by reference,
+so readers never need a lock.
+"""
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_RATES = {
+    'USD': 1.0,
+    'KES': 128.5,      # Kenyan Shilling
+    'UGX': 3582.34,    # Ugandan Shilling
+    'BIF': 2850.0,     # Burundi Franc
+    'CDF': 2700.0      # Congolese Franc
+}
+
+CURRENCY_SYMBOLS = {
+    'USD': '$',
+    'KES': 'KSh',
+    'UGX': 'USh',
+    'BIF': 'FBu',
+    'CDF': 'FC'
+}
+
+CURRENCY_COUNTRIES = {
+    'KES': 'Kenya',
+    'UGX': 'Uganda',
+    'BIF': 'Burundi',
+    'CDF': 'DRC Congo'
+}
+
+
+class RateSnapshot:
+    """Immutable set of rates and the cross-rate matrix derived from them"""
+
+    def __init__(self, usd_rates, version=0, fetched_at=None, source='default'):
+        self.currencies = tuple(usd_rates)
+        self.index = {code: i for i, code in enumerate(self.currencies)}
+        self.usd_rates = np.array([usd_rates[c] for c in self.currencies], dtype=np.float64)
+        # matrix[i, j] converts one unit of currencies[i] into currencies[j]
+        self.matrix = self.usd_rates[np.newaxis, :] / self.usd_rates[:, np.newaxis]
+        self.matrix.setflags(write=False)
+        self.version = version
+        self.fetched_at = fetched_at or datetime.utcnow()
+        self.source = source
+
+    def as_dict(self):
+        return {c: float(r) for c, r in zip(self.currencies, self.usd_rates)}
+
+    def age_seconds(self, now=None):
+        return ((now or datetime.utcnow()) - self.fetched_at).total_seconds()
+
+
+class ExchangeRateService:
+    """Conversions against the current rate snapshot"""
+
+    def __init__(self, usd_rates=None):
+        self._snapshot = RateSnapshot(dict(usd_rates or DEFAULT_RATES))
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def swap(self, snapshot):
+        """Publish a new snapshot; a single reference assignment, so readers never lock"""
+        if snapshot.currencies != self._snapshot.currencies:
+            raise ValueError('Snapshot currencies do not match the service')
+        self._snapshot = snapshot
+
+    @property
+    def currencies(self):
+        return self._snapshot.currencies
+
+    def supports(self, currency):
+        return currency in self._snapshot.index
+
+    def _position(self, snapshot, currency):
+        try:
+            return snapshot.index[currency.upper()]
+        except (KeyError, AttributeError):
+            raise ValueError(f"Unsupported currency: {currency}")
+
+    def rate(self, source, target, default=None):
+        """Units of `target` per unit of `source`"""
+        snapshot = self._snapshot
+        try:
+            return float(snapshot.matrix[self._position(snapshot, source), self._position(snapshot, target)])
+        except ValueError:
+            if default is not None:
+                return default
+            raise
+
+    def convert(self, amount, source='USD', target='USD', decimals=2):
+        return round(amount * self.rate(source, target), decimals)
+
+    def convert_many(self, amounts, sources, targets):
+        """Convert many amounts between many currency pairs in one call.
+
+        `sources` and `targets` may each be a single code or a sequence the
+        same length as `amounts`. Returns an unrounded float array.
+        """
+        snapshot = self._snapshot
+        amounts = np.asarray(amounts, dtype=np.float64)
+
+        def positions(codes):
+            if isinstance(codes, str):
+                return self._position(snapshot, codes)
+            return np.fromiter((self._position(snapshot, c) for c in codes), dtype=np.intp, count=len(codes))
+
+        return amounts * snapshot.matrix[positions(sources), positions(targets)]
+
+    def price_table(self, amounts_usd, currencies=None, snapshot=None):
+        """Matrix of USD amounts converted into each currency, shape (len(amounts), len(currencies))"""
+        snapshot = snapshot or self._snapshot
+        currencies = currencies or snapshot.currencies
+        columns = [self._position(snapshot, c) for c in currencies]
+        return np.outer(np.asarray(amounts_usd, dtype=np.float64), snapshot.usd_rates[columns])
+
+
+# Process-wide service used by all routes and helpers
+rates = ExchangeRateService()
@@ -0,0 +1,272 @@
+# app/utils/rate_refresher.py
+"""Background refresh of exchange rates.
+
+A daemon thread polls a rate source (the HTTP provider at CURRENCY_API_URL in
+production, a JSON file or a static mapping in tests), validates what it gets,
+persists it with a timestamp to the `fx_rates` collection and swaps it into
+the process-wide `rates` service. Requests only ever read the current
+snapshot, so no price render waits on the provider.
+
+On startup the newest persisted snapshot is loaded as the last known good
+rates, so a provider outage at boot does not fall back to the built-in table.
+"""
+import calendar
+import json
+import logging
+import math
+import threading
+import urllib.request
+from datetime import datetime
+
+from app.utils.exchange_rates import RateSnapshot, rates as default_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_SECONDS = 3600
+DEFAULT_STALE_SECONDS = 6 * 3600
+
+# Reject a snapshot when any rate moves by more than this fraction at once
+DEFAULT_MAX_CHANGE = 0.5
+
+
+class RateSourceError(Exception):
+    """A source could not produce a usable set of rates"""
+
+
+def _usd_rates(payload):
+    """Accept {'base': 'USD', 'rates': {...}} or a bare {code: rate} mapping"""
+    if not isinstance(payload, dict):
+        raise RateSourceError('Rate payload must be a JSON object')
+    base = str(payload.get('base', 'USD')).upper()
+    if base != 'USD':
+        raise RateSourceError(f'Rates must be quoted against USD, got {base}')
+    return payload.get('rates', payload)
+
+
+class HttpRateSource:
+    """Rates from an exchangerate-api style JSON endpoint"""
+
+    name = 'http'
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        try:
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+                return _usd_rates(json.loads(response.read().decode('utf-8')))
+        except RateSourceError:
+            raise
+        except Exception as e:
+            raise RateSourceError(f'Fetching {self.url} failed: {e}') from e
+
+
+class FileRateSource:
+    """Rates from a local JSON file, in the same shape as the HTTP provider"""
+
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return _usd_rates(json.load(f))
+        except RateSourceError:
+            raise
+        except Exception as e:
+            raise RateSourceError(f'Reading {self.path} failed: {e}') from e
+
+
+class StaticRateSource:
+    """Fixed rates, for tests and local development"""
+
+    name = 'static'
+
+    def __init__(self, usd_rates):
+        self.usd_rates = dict(usd_rates)
+
+    def fetch(self):
+        return dict(self.usd_rates)
+
+
+def validate_rates(raw, current, max_change=DEFAULT_MAX_CHANGE):
+    """Check fetched rates against the current snapshot, returning {code: rate}.
+
+    Every currency the service supports must be present as a finite positive
+    number, USD must be 1, and no rate may jump by more than `max_change`
+    (0 disables that check). Extra currencies from the provider are ignored.
+    """
+    validated = {}
+    for code in current.currencies:
+        value = raw.get(code)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Missing or non-numeric rate for {code}')
+        if not math.isfinite(value) or value <= 0:
+            raise ValueError(f'Invalid rate for {code}: {value}')
+        validated[code] = value
+
+    if validated['USD'] != 1:
+        raise ValueError('USD rate must be 1')
+
+    if max_change:
+        previous = current.as_dict()
+        for code, value in validated.items():
+            change = abs(value - previous[code]) / previous[code]
+            if change > max_change:
+                raise ValueError(f'{code} moved {change:.0%}, more than the allowed {max_change:.0%}')
+    return validated
+
+
+class RateRefresher:
+    """Polls a source on an interval and publishes validated snapshots"""
+
+    def __init__(self, source, db=None, service=None, interval=DEFAULT_REFRESH_SECONDS,
+                 stale_after=DEFAULT_STALE_SECONDS, max_change=DEFAULT_MAX_CHANGE):
+        self.source = source
+        self.db = db
+        self.service = service or default_service
+        self.interval = interval
+        self.stale_after = stale_after
+        self.max_change = max_change
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+        # Written only by the refreshing thread, read by /health
+        self.last_attempt_at = None
+        self.last_success_at = None
+        self.last_error = None
+        self.refreshes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+
+    def _publish(self, usd_rates, fetched_at, source):
+        # Versions are the fetch time, so they order the same way in every worker
+        snapshot = RateSnapshot(usd_rates, version=calendar.timegm(fetched_at.utctimetuple()),
+                                fetched_at=fetched_at, source=source)
+        self.service.swap(snapshot)
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                logger.exception('Exchange rate listener %r failed', listener)
+        return snapshot
+
+    def init_app(self, app):
+        """Make this the refresher that code running in `app` refreshes through"""
+        app.extensions['rate_refresher'] = self
+
+    def on_publish(self, listener):
+        """Call `listener(snapshot)` after every new snapshot is swapped in"""
+        self._listeners.append(listener)
+        return listener
+
+    def _latest_persisted(self):
+        if self.db is None:
+            return None
+        return self.db.fx_rates.find_one({}, sort=[('fetched_at', -1)])
+
+    def load_last_good(self):
+        """Adopt the newest persisted snapshot, if any; returns True when one was loaded"""
+        try:
+            doc = self._latest_persisted()
+            if not doc:
+                return False
+            usd_rates = validate_rates(doc['rates'], self.service.snapshot, max_change=0)
+            self._publish(usd_rates, doc['fetched_at'], doc.get('source', 'persisted'))
+            return True
+        except Exception as e:
+            logger.warning('Could not load persisted exchange rates: %s', e)
+            return False
+
+    def refresh(self, force=False):
+        """Fetch, validate, persist and publish one snapshot; returns True on success.
+
+        Unless `force` is set, a snapshot another worker persisted within the
+        last interval is adopted instead of calling the provider again.
+        """
+        now = datetime.utcnow()
+        self.last_attempt_at = now
+        try:
+            latest = None if force else self._latest_persisted()
+            current = self.service.snapshot
+            if latest and (now - latest['fetched_at']).total_seconds() < self.interval:
+                if latest['fetched_at'] > current.fetched_at or current.source == 'default':
+                    usd_rates = validate_rates(latest['rates'], current, max_change=0)
+                    self._publish(usd_rates, latest['fetched_at'], latest.get('source', 'persisted'))
+            else:
+                usd_rates = validate_rates(self.source.fetch(), current, self.max_change)
+                if self.db is not None:
+                    self.db.fx_rates.insert_one({
+                        'base': 'USD',
+                        'rates': usd_rates,
+                        'source': self.source.name,
+                        'fetched_at': now
+                    })
+                self._publish(usd_rates, now, self.source.name)
+        except Exception as e:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(e)
+            logger.warning('Exchange rate refresh failed: %s', e)
+            return False
+
+        self.refreshes += 1
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_success_at = now
+        return True
+
+    def _run(self):
+        self.refresh()
+        while True:
+            # Retry sooner while the provider is failing
+            wait = self.interval if not self.consecutive_failures else min(self.interval, 60)
+            if self._stop.wait(wait):
+                return
+            self.refresh()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='fx-rate-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def metrics(self):
+        snapshot = self.service.snapshot
+        age = snapshot.age_seconds()
+
+        def iso(moment):
+            return moment.isoformat() if moment else None
+
+        return {
+            'version': snapshot.version,
+            'source': snapshot.source,
+            'fetched_at': iso(snapshot.fetched_at),
+            'age_seconds': round(age, 1),
+            'stale': snapshot.source == 'default' or age > self.stale_after,
+            'last_attempt_at': iso(self.last_attempt_at),
+            'last_success_at': iso(self.last_success_at),
+            'last_error': self.last_error,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures
+        }
+
+
+def source_from_config(config):
+    """HTTP provider from CURRENCY_API_URL unless FX_RATES_FILE points at a local file"""
+    if config.get('FX_RATES_FILE'):
+        return FileRateSource(config['FX_RATES_FILE'])
+    return HttpRateSource(config['CURRENCY_API_URL'])
@@ -0,0 +1,140 @@
+"""JWT claims and claim-only authorization.
+
+Tokens carry the user's role, permissions, country and preferred currency as
+additional claims, so routes that only need those (authorization checks,
+currency display) read them from the verified token instead of loading the
+user. Claims are fixed for the token's lifetime: a role or currency change
+takes effect at the next login. Admin changes are the exception. A token lives
+24 hours, and a suspended, demoted or deleted admin must lose write access well
+before then. So non-read admin requests also re-check the stored user through
+the loader given to init_app, which is backed by the UserCache.
+
+The few routes that need the user document itself go through UserCache, a
+short-TTL per-process cache of the profile fields.
+"""
+import threading
+import time
+from functools import wraps
+
+from bson import ObjectId
+from flask import current_app, jsonify, request
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
+
+ADMIN_ROLES = ('admin', 'super_admin')
+
+# Methods that only read, so only need the role rather than 'write'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Profile fields worth caching; never the password hash, cart or orders
+PROFILE_PROJECTION = {
+    'username': 1, 'name': 1, 'email': 1, 'phone': 1, 'country': 1,
+    'preferred_currency': 1, 'role': 1, 'permissions': 1, 'status': 1, 'created_at': 1
+}
+
+
+def user_claims(user):
+    """Additional JWT claims for `user`"""
+    role = user.get('role', 'customer')
+    return {
+        'role': role,
+        # Admins created before permissions existed have full access
+        'permissions': user.get('permissions', ['*'] if role in ADMIN_ROLES else []),
+        'country': user.get('country'),
+        'preferred_currency': user.get('preferred_currency')
+    }
+
+
+def issue_token(user):
+    """Access token for a user document, carrying its claims"""
+    return create_access_token(identity=str(user['_id']), additional_claims=user_claims(user))
+
+
+def claim(name, default=None):
+    """One claim of the current token (call inside a jwt_required view)"""
+    value = get_jwt().get(name)
+    return default if value is None else value
+
+
+def has_permission(claims, permission):
+    permissions = claims.get('permissions') or []
+    return '*' in permissions or permission in permissions
+
+
+def init_app(app, load_user):
+    """Have write checks re-read the user with `load_user(user_id)`, a cached lookup"""
+    app.extensions['authz_load_user'] = load_user
+
+
+def user_may_write(user_id, roles, write_permission):
+    """Whether the stored user still holds one of `roles` and `write_permission`"""
+    load_user = current_app.extensions.get('authz_load_user')
+    if load_user is None:
+        return True
+    user = load_user(user_id)
+    if not user or user.get('status') == 'suspended' or user.get('role') not in roles:
+        return False
+    return has_permission(user_claims(user), write_permission)
+
+
+def role_required(*roles, permission=None, write_permission=None):
+    """Require a valid token whose role claim is one of `roles`.
+
+    `permission` is required of every request, `write_permission` only of
+    non-read methods. Reads look at nothing but the token; writes under
+    `write_permission` also re-check the stored user (see init_app).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            claims = get_jwt()
+            if claims.get('role') not in roles:
+                return jsonify({'error': 'Forbidden'}), 403
+            if permission and not has_permission(claims, permission):
+                return jsonify({'error': 'Forbidden'}), 403
+            if write_permission and request.method not in SAFE_METHODS:
+                if not has_permission(claims, write_permission):
+                    return jsonify({'error': 'Forbidden'}), 403
+                if not user_may_write(get_jwt_identity(), roles, write_permission):
+                    return jsonify({'error': 'Forbidden'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Any admin may read; changes also need the 'write' permission
+admin_required = role_required(*ADMIN_ROLES, write_permission='write')
+
+
+class UserCache:
+    """Profile documents by user id, kept for `ttl` seconds"""
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, collection, user_id):
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry and now - entry[0] < self.ttl:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        user = collection.find_one({'_id': ObjectId(user_id)}, PROFILE_PROJECTION)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: e for k, e in self._entries.items() if now - e[0] < self.ttl}
+            self._entries[user_id] = (now, user)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
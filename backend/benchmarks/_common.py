@@ -0,0 +1,28 @@
+"""Harness shared by the benchmark scripts.
+
+Import it before any app module: it defaults MONGO_URI to the queenkoba_bench
+database, so a benchmark never writes to the real one by accident, and puts
+backend/ on sys.path.
+
+    from _common import mongo_ops, percentile
+    import queenkoba_mongodb as api
+"""
+import os
+import sys
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/queenkoba_bench')
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def mongo_ops(db):
+    """Total operations the server behind `db` has executed so far"""
+    counters = db.command('serverStatus')['opcounters']
+    return sum(counters[name] for name in ('query', 'insert', 'update', 'delete', 'command'))
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Flask (WSGI) vs the ASGI app at high concurrency.
+
+Starts each server in turn against a real mongod, then keeps BENCH_CONCURRENCY
+keep-alive connections busy for BENCH_SECONDS with a mix of Mongo-bound
+storefront reads (order history, cart, product detail) as one customer, and
+prints requests per second and latency percentiles per route.
+
+    MONGO_URI=mongodb://localhost:27017/queenkoba_bench python benchmarks/bench_async.py
+
+The Flask app runs on its threaded development server unless BENCH_SYNC_CMD
+gives another command (it is formatted with {port}); the ASGI app runs under
+uvicorn.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import statistics
+import urllib.request
+from datetime import datetime, timedelta
+
+from _common import BACKEND, percentile
+
+from bson import ObjectId
+import queenkoba_mongodb as api
+from authz import issue_token
+
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '256'))
+SECONDS = float(os.getenv('BENCH_SECONDS', '15'))
+ORDERS = int(os.getenv('BENCH_ORDERS', '20'))
+PORT = int(os.getenv('BENCH_PORT', '5055'))
+
+SERVERS = {
+    'flask': os.getenv('BENCH_SYNC_CMD', f"{sys.executable} -c \"import queenkoba_mongodb as api; "
+                                         "api.app.run(port={port}, threaded=True)\""),
+    'asgi': f'{sys.executable} -m uvicorn queenkoba_async:app --port {{port}} --log-level warning',
+}
+
+
+class Connection:
+    """Minimal HTTP/1.1 client that reuses its socket while the server allows it"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        lines = [f'GET {path} HTTP/1.1', 'Host: localhost'] + [f'{k}: {v}' for k, v in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+
+        status_line = await self.reader.readline()
+        status = int(status_line.split()[1])
+        length, close = 0, status_line.startswith(b'HTTP/1.0')
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection':
+                close = value.strip().lower() == 'close'
+        await self.reader.readexactly(length)
+
+        if close:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def drive(port, paths, headers):
+    """Returns ({path: [ms]}, errors, seconds) for CONCURRENCY clients over SECONDS"""
+    timings = {path: [] for path in paths}
+    errors = 0
+    deadline = time.perf_counter() + SECONDS
+
+    async def client(offset):
+        nonlocal errors
+        connection = Connection(port)
+        n = offset
+        while time.perf_counter() < deadline:
+            path = paths[n % len(paths)]
+            n += 1
+            start = time.perf_counter()
+            try:
+                status = await connection.get(path, headers)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                connection.close()
+                errors += 1
+                continue
+            if status != 200:
+                errors += 1
+            timings[path].append((time.perf_counter() - start) * 1000)
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(CONCURRENCY)))
+    return timings, errors, time.perf_counter() - started
+
+
+def wait_until_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with {process.returncode}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/products', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not come up')
+
+
+def main():
+    db = api.mongo.db
+    api.seed_products()
+    products = list(db.products.find({}, {'_id': 1, 'base_price_usd': 1}).limit(5))
+    now = datetime.utcnow()
+
+    user_id = db.users.insert_one({
+        'username': 'async-bench',
+        'email': f'async-bench-{ObjectId()}@queenkoba.com',
+        'role': 'customer',
+        'preferred_currency': 'KES',
+        'cart': [{
+            'product_id': str(p['_id']),
+            'quantity': 1,
+            'unit_price_usd': p['base_price_usd'],
+            'added_at': now
+        } for p in products],
+        'cart_subtotal_usd': sum(p['base_price_usd'] for p in products),
+        'created_at': now
+    }).inserted_id
+    db.orders.insert_many([{
+        'order_id': f'BENCH{i:03d}',
+        'user_id': str(user_id),
+        'items': [],
+        'total_usd': 10.0,
+        'currency': 'KES',
+        'total_local': 1290.0,
+        'payment_status': 'pending',
+        'order_status': 'processing',
+        'created_at': now - timedelta(days=i),
+        'updated_at': now
+    } for i in range(ORDERS)])
+
+    with api.app.app_context():
+        headers = {'Authorization': f'Bearer {issue_token(db.users.find_one({"_id": user_id}))}'}
+    paths = ['/orders', '/cart', f"/products/{products[0]['_id']}"]
+
+    print(f"{CONCURRENCY} connections for {SECONDS:.0f}s per server\n")
+    print(f"{'server':>7} {'route':>32} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    try:
+        for name, command in SERVERS.items():
+            process = subprocess.Popen(command.format(port=PORT), shell=True, cwd=BACKEND,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_ready(PORT, process)
+                timings, errors, seconds = asyncio.run(drive(PORT, paths, headers))
+            finally:
+                process.terminate()
+                process.wait()
+
+            for path, samples in timings.items():
+                if samples:
+                    print(f"{name:>7} {path:>32} {len(samples) / seconds:>9.1f} "
+                          f"{statistics.median(samples):>9.2f} {percentile(samples, 99):>9.2f}")
+            total = sum(len(samples) for samples in timings.values())
+            print(f"{name:>7} {'all':>32} {total / seconds:>9.1f}    errors: {errors}\n")
+    finally:
+        db.users.delete_one({'_id': user_id})
+        db.orders.delete_many({'user_id': str(user_id)})
+
+
+if __name__ == '__main__':
+    main()
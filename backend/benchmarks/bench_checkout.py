@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Checkout latency vs cart size.
+
+Runs POST /checkout through the Flask test client against a real mongod and
+prints latency percentiles and Mongo operations per checkout for growing cart
+sizes. With bulk product loading both should stay flat as the cart grows.
+
+    MONGO_URI=mongodb://localhost:27017/queenkoba_bench python benchmarks/bench_checkout.py
+"""
+import os
+import time
+import statistics
+from datetime import datetime
+
+from _common import mongo_ops, percentile
+
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+import queenkoba_mongodb as api
+
+CART_SIZES = [1, 5, 10, 25, 50]
+ITERATIONS = int(os.getenv('BENCH_ITERATIONS', '50'))
+
+
+def main():
+    db = api.mongo.db
+    client = api.app.test_client()
+
+    with api.app.app_context():
+        user_id = db.users.insert_one({
+            'username': 'bench',
+            'email': f'bench-{ObjectId()}@queenkoba.com',
+            'role': 'customer',
+            'preferred_currency': 'KES',
+            'cart': [],
+            'orders': [],
+            'created_at': datetime.utcnow()
+        }).inserted_id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+    products = [{
+        '_id': ObjectId(),
+        'name': f'Bench Product {i}',
+        'base_price_usd': 10.0 + i,
+        'in_stock': True,
+        'created_at': datetime.utcnow()
+    } for i in range(max(CART_SIZES))]
+    db.products.insert_many(products)
+
+    print(f"{'cart size':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'mongo ops':>10}")
+    try:
+        for size in CART_SIZES:
+            cart = [{
+                'product_id': str(p['_id']),
+                'quantity': 1,
+                'added_at': datetime.utcnow()
+            } for p in products[:size]]
+
+            timings = []
+            ops = []
+            for _ in range(ITERATIONS):
+                db.users.update_one({'_id': user_id}, {'$set': {'cart': cart}})
+                ops_before = mongo_ops(db)
+                start = time.perf_counter()
+                response = client.post('/checkout', json={'payment_method': 'mpesa'}, headers=headers)
+                timings.append((time.perf_counter() - start) * 1000)
+                # serverStatus itself counts as one command
+                ops.append(mongo_ops(db) - ops_before - 1)
+                assert response.status_code == 200, response.get_json()
+
+            print(f"{size:>10} {statistics.median(timings):>10.2f} {percentile(timings, 95):>10.2f} "
+                  f"{percentile(timings, 99):>10.2f} {statistics.median(ops):>10.0f}")
+    finally:
+        db.orders.delete_many({'user_id': str(user_id)})
+        db.products.delete_many({'_id': {'$in': [p['_id'] for p in products]}})
+        db.users.delete_one({'_id': user_id})
+
+
+if __name__ == '__main__':
+    main()
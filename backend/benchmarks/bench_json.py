@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""JSON encoding of the /products and /admin/orders payloads: Flask's default provider vs orjson.
+
+Builds payloads shaped like what those routes return (BENCH_PRODUCTS priced
+products, BENCH_ORDERS orders with BENCH_ITEMS lines each) and times turning
+them into a response body both ways:
+
+    default   serialize_doc() on every document, then Flask's DefaultJSONProvider
+    orjson    OrjsonProvider straight from the driver's documents
+
+No database is needed.
+
+    python benchmarks/bench_json.py
+"""
+import os
+import time
+import statistics
+from datetime import datetime, timedelta
+
+from _common import percentile
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import OrjsonProvider
+from product_prices import price_fields
+from storefront import build_order
+
+PRODUCTS = int(os.getenv('BENCH_PRODUCTS', '200'))
+ORDERS = int(os.getenv('BENCH_ORDERS', '50'))
+ITEMS = int(os.getenv('BENCH_ITEMS', '4'))
+ROUNDS = int(os.getenv('BENCH_ROUNDS', '200'))
+
+
+def serialize_doc(doc):
+    """What views did before the orjson provider: copy the document with a string _id"""
+    return dict(doc, _id=str(doc['_id']))
+
+
+def products_payload():
+    now = datetime.utcnow()
+    products = []
+    for i in range(PRODUCTS):
+        price = 10 + i % 40 + 0.99
+        product = {
+            '_id': ObjectId(),
+            'name': f'Complexion Product {i}',
+            'description': 'Powerful serum with Vitamin C and Niacinamide',
+            'base_price_usd': price,
+            'category': ('Cream', 'Serum', 'Mask', 'Scrub')[i % 4],
+            'in_stock': True,
+            'image_url': f'/images/product-{i}.jpg',
+            'created_at': now,
+            'updated_at': now
+        }
+        product.update(price_fields(price))
+        products.append(product)
+    return products
+
+
+def orders_payload(products):
+    """Orders as checkout builds them, from carts of BENCH_ITEMS catalog products"""
+    now = datetime.utcnow()
+    by_id = {str(p['_id']): p for p in products}
+    checkout = {
+        'shipping_address': {'name': 'Bench Customer', 'city': 'Nairobi', 'country': 'Kenya'},
+        'payment_method': 'mpesa'
+    }
+    orders = []
+    for i in range(ORDERS):
+        cart = [{
+            'product_id': str(products[(i + n) % len(products)]['_id']),
+            'quantity': 1 + n % 3
+        } for n in range(ITEMS)]
+        order = build_order(str(ObjectId()), cart, by_id, 'KES', checkout)
+        order['created_at'] = now - timedelta(minutes=i)
+        orders.append(order)
+    return orders
+
+
+def timed(encode):
+    """Median and p99 milliseconds of `encode()` over ROUNDS, and its size in bytes"""
+    size = len(encode())
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        encode()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), percentile(samples, 99), size
+
+
+def main():
+    app = Flask(__name__)
+    default, fast = DefaultJSONProvider(app), OrjsonProvider(app)
+    products = products_payload()
+    orders = orders_payload(products)
+
+    # The catalog cache already stores string ids, so /products only ever paid for the encoder
+    catalog = [serialize_doc(p) for p in products]
+    cases = {
+        '/products': (
+            lambda: default.dumps({'status': 'success', 'count': len(catalog), 'products': catalog}),
+            lambda: fast.encode({'status': 'success', 'count': len(products), 'products': products})
+        ),
+        '/admin/orders': (
+            lambda: default.dumps({'orders': [serialize_doc(o) for o in orders], 'next_cursor': None}),
+            lambda: fast.encode({'orders': orders, 'next_cursor': None})
+        ),
+    }
+
+    print(f"{PRODUCTS} products, {ORDERS} orders of {ITEMS} lines, {ROUNDS} rounds\n")
+    print(f"{'payload':>14} {'encoder':>8} {'KB':>7} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8}")
+    for name, (before, after) in cases.items():
+        baseline = None
+        for encoder, encode in (('default', before), ('orjson', after)):
+            p50, p99, size = timed(encode)
+            baseline = baseline or p50
+            print(f"{name:>14} {encoder:>8} {size / 1024:>7.1f} {p50:>8.3f} {p99:>8.3f} {baseline / p50:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Login throughput vs bcrypt cost factor.
+
+Fires concurrent POST /auth/login requests through the Flask test client
+against a real mongod for each cost factor, and prints successful logins per
+second, latency percentiles and how many requests the password pool refused
+with 503 once it was saturated.
+
+    MONGO_URI=mongodb://localhost:27017/queenkoba_bench python benchmarks/bench_login.py
+
+BENCH_COSTS, BENCH_CONCURRENCY and BENCH_LOGINS tune the run.
+"""
+import os
+import time
+import statistics
+import threading
+from datetime import datetime
+
+from _common import percentile
+
+from bson import ObjectId
+import queenkoba_mongodb as api
+from password_pool import PasswordPool
+
+COSTS = [int(c) for c in os.getenv('BENCH_COSTS', '8,10,12').split(',')]
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '16'))
+LOGINS = int(os.getenv('BENCH_LOGINS', '64'))
+PASSWORD = 'bench-password'
+
+
+def run_logins(email):
+    """Send LOGINS requests from CONCURRENCY threads; returns (timings, statuses, seconds)"""
+    timings, statuses = [], []
+    lock = threading.Lock()
+    remaining = iter(range(LOGINS))
+
+    def worker():
+        client = api.app.test_client()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            response = client.post('/auth/login', json={'email': email, 'password': PASSWORD})
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                timings.append(elapsed)
+                statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(CONCURRENCY)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, statuses, time.perf_counter() - started
+
+
+def main():
+    db = api.mongo.db
+    # Every login targets one email, which the login rate limit would cap at a few a minute
+    api.limiter.enabled = False
+    workers = api.app.config['BCRYPT_WORKERS']
+    max_pending = api.app.config['BCRYPT_MAX_PENDING']
+    print(f"pool: {workers} workers, {max_pending} queued; {CONCURRENCY} clients, {LOGINS} logins per cost\n")
+    print(f"{'cost':>6} {'logins/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'503s':>6}")
+
+    user_ids = []
+    try:
+        for cost in COSTS:
+            api.passwords = PasswordPool(rounds=cost, workers=workers, max_pending=max_pending)
+            email = f'bench-{ObjectId()}@queenkoba.com'
+            user_ids.append(db.users.insert_one({
+                'username': f'bench-{cost}',
+                'email': email,
+                'password_hash': api.passwords.hash(PASSWORD),
+                'role': 'customer',
+                'country': 'Kenya',
+                'preferred_currency': 'KES',
+                'created_at': datetime.utcnow()
+            }).inserted_id)
+
+            timings, statuses, seconds = run_logins(email)
+            ok = statuses.count(200)
+            print(f"{cost:>6} {ok / seconds:>10.1f} {statistics.median(timings):>10.2f} "
+                  f"{percentile(timings, 95):>10.2f} {percentile(timings, 99):>10.2f} {statuses.count(503):>6}")
+    finally:
+        db.users.delete_many({'_id': {'$in': user_ids}})
+
+
+if __name__ == '__main__':
+    main()
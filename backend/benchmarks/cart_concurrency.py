@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Concurrent cart mutations against a real mongod.
+
+Several clients (think browser tabs of one user) add the same products to one
+cart at the same time, then send PUT /cart/quantities batches at the same
+time. It passes, exiting 0, only if:
+
+    - every request succeeded
+    - no add was lost: each line's quantity is the number of adds sent for it
+    - after the concurrent batches each product has exactly one line, holding
+      a quantity one of the clients sent for it
+    - the stored cart_subtotal_usd matches the cart's lines after each phase
+
+and exits 1 otherwise. It also reports Mongo operations per batch, which
+should be 1. Run it against a mongod it may write to:
+
+    MONGO_URI=mongodb://localhost:27017/queenkoba_bench python benchmarks/cart_concurrency.py
+"""
+import os
+import sys
+import threading
+import statistics
+from datetime import datetime
+
+from _common import mongo_ops
+
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+import queenkoba_mongodb as api
+
+CLIENTS = int(os.getenv('BENCH_CLIENTS', '8'))
+ADDS_PER_CLIENT = int(os.getenv('BENCH_ADDS', '25'))
+PRODUCTS = 3
+
+
+def main():
+    db = api.mongo.db
+    products = [{
+        '_id': ObjectId(),
+        'name': f'Cart Bench {i}',
+        'base_price_usd': 5.0 + i,
+        'in_stock': True,
+        'created_at': datetime.utcnow()
+    } for i in range(PRODUCTS)]
+    db.products.insert_many(products)
+    api.catalog_cache.invalidate()
+    product_ids = [str(p['_id']) for p in products]
+
+    user_id = db.users.insert_one({
+        'username': 'cart-bench',
+        'email': f'cart-bench-{ObjectId()}@queenkoba.com',
+        'role': 'customer',
+        'preferred_currency': 'KES',
+        'cart': [],
+        'created_at': datetime.utcnow()
+    }).inserted_id
+    with api.app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+    failures = []
+
+    def subtotal_ok():
+        user = db.users.find_one({'_id': user_id})
+        lines = sum(line['unit_price_usd'] * line['quantity'] for line in user['cart'])
+        return abs(user.get('cart_subtotal_usd', 0) - lines) < 1e-6
+
+    def client(index):
+        http = api.app.test_client()
+        for n in range(ADDS_PER_CLIENT):
+            product_id = product_ids[(index + n) % PRODUCTS]
+            response = http.post('/cart/add', json={'product_id': product_id, 'quantity': 1}, headers=headers)
+            if response.status_code != 200:
+                failures.append(response.get_json())
+
+    try:
+        # Warm the catalog cache so the timed section only does cart writes
+        api.catalog_cache.snapshot(db.products)
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = {pid: 0 for pid in product_ids}
+        for index in range(CLIENTS):
+            for n in range(ADDS_PER_CLIENT):
+                expected[product_ids[(index + n) % PRODUCTS]] += 1
+
+        cart = db.users.find_one({'_id': user_id})['cart']
+        actual = {line['product_id']: line['quantity'] for line in cart}
+        lines_ok = len(cart) == PRODUCTS and actual == expected and subtotal_ok()
+        print(f"{CLIENTS} clients x {ADDS_PER_CLIENT} adds: expected {expected}, got {actual}")
+
+        # Every client sets every line at once, each to its own quantities
+        def batch_client(index):
+            http = api.app.test_client()
+            for n in range(ADDS_PER_CLIENT):
+                items = [{'product_id': pid, 'quantity': 1 + index * ADDS_PER_CLIENT + n} for pid in product_ids]
+                # 409 asks the client to try again, as a browser tab would
+                for _ in range(5):
+                    response = http.put('/cart/quantities', json={'items': items}, headers=headers)
+                    if response.status_code != 409:
+                        break
+                if response.status_code != 200:
+                    failures.append(response.get_json())
+
+        threads = [threading.Thread(target=batch_client, args=(i,)) for i in range(CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        cart = db.users.find_one({'_id': user_id})['cart']
+        sent = range(1, CLIENTS * ADDS_PER_CLIENT + 1)
+        batches_ok = (sorted(line['product_id'] for line in cart) == sorted(product_ids)
+                      and all(line['quantity'] in sent for line in cart) and subtotal_ok())
+        lines_ok = lines_ok and batches_ok
+        print(f"{CLIENTS} clients x {ADDS_PER_CLIENT} batch sets: "
+              f"{ {line['product_id']: line['quantity'] for line in cart} }")
+
+        # Round trips per mutation, measured one request at a time
+        http = api.app.test_client()
+        ops = []
+        for quantity in range(1, 11):
+            before = mongo_ops(db)
+            http.put('/cart/quantities', json={'items': [
+                {'product_id': pid, 'quantity': quantity} for pid in product_ids
+            ]}, headers=headers)
+            # serverStatus itself counts as one command
+            ops.append(mongo_ops(db) - before - 1)
+        print(f"mongo ops per batch set of {PRODUCTS} lines: {statistics.median(ops):.0f}")
+
+        if failures or not lines_ok:
+            print(f"❌ lost updates or failed requests: {failures[:5]}")
+            sys.exit(1)
+        print("✅ no lost updates")
+    finally:
+        db.users.delete_one({'_id': user_id})
+        db.products.delete_many({'_id': {'$in': [p['_id'] for p in products]}})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""End-to-end load test of the storefront and checkout flows.
+
+BENCH_CONCURRENCY virtual shoppers replay sessions for BENCH_SECONDS. Every
+session browses /products and views a few /products/<id>. A BENCH_BUY_RATIO
+share of sessions then log in, add to the cart, look at /cart, check out
+(BENCH_CHECKOUT_RATIO of those) and open /orders. Throughput, latency
+percentiles and error counts are printed per route.
+
+    MONGO_URI=mongodb://localhost:27017/queenkoba_bench python benchmarks/load_test.py
+    python benchmarks/load_test.py --save       # record the results as the baseline
+    python benchmarks/load_test.py --compare    # diff against it; exits 1 on regression
+
+Requests go through the Flask test client unless BENCH_URL points at a
+running server (gunicorn, uvicorn...) that uses the same MONGO_URI; start
+that one with RATE_LIMITS_ENABLED=false, since every shopper logs in from
+the same address. The baseline (BENCH_BASELINE, load_baseline.json next to
+this file by default) is plain JSON with rounded numbers, so a change in
+throughput or latency shows up in its diff. --compare fails when a route's
+p95 rises or its throughput falls by more than BENCH_MAX_REGRESSION (20%).
+"""
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from _common import percentile
+
+from bson import ObjectId
+import queenkoba_mongodb as api
+
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '32'))
+SECONDS = float(os.getenv('BENCH_SECONDS', '30'))
+BUY_RATIO = float(os.getenv('BENCH_BUY_RATIO', '0.3'))
+CHECKOUT_RATIO = float(os.getenv('BENCH_CHECKOUT_RATIO', '0.5'))
+BASE_URL = os.getenv('BENCH_URL', '')
+BASELINE = os.getenv('BENCH_BASELINE', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    'load_baseline.json'))
+MAX_REGRESSION = float(os.getenv('BENCH_MAX_REGRESSION', '0.2'))
+PASSWORD = 'load-test-password'
+
+
+class TestClientSession:
+    """Requests through the Flask test client, in process"""
+
+    def __init__(self):
+        self.client = api.app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpSession:
+    """Requests over one keep-alive HTTP connection to BENCH_URL"""
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                # The server closed an idle keep-alive connection; retry once on a new one
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+
+
+class Recorder:
+    """Latencies and statuses per route, shared by every shopper"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+
+    def call(self, session, route, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        try:
+            status, data = session.request(method, path, body, headers)
+        except Exception:
+            status, data = None, None
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.timings.setdefault(route, []).append(elapsed)
+            if status is None or status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return status, data
+
+
+def shopper(recorder, session, email, product_ids, deadline, seed):
+    """Replay sessions until `deadline`"""
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        recorder.call(session, '/products', 'GET', '/products')
+        for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 3))):
+            recorder.call(session, '/products/<id>', 'GET', f'/products/{product_id}')
+
+        if rng.random() >= BUY_RATIO:
+            continue
+
+        status, data = recorder.call(session, '/auth/login', 'POST', '/auth/login',
+                                     {'email': email, 'password': PASSWORD})
+        if status != 200:
+            continue
+        headers = {'Authorization': f"Bearer {data['token']}"}
+
+        for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 3))):
+            recorder.call(session, '/cart/add', 'POST', '/cart/add',
+                          {'product_id': product_id, 'quantity': rng.randint(1, 2)}, headers)
+        recorder.call(session, '/cart', 'GET', '/cart', headers=headers)
+        if rng.random() < CHECKOUT_RATIO:
+            recorder.call(session, '/checkout', 'POST', '/checkout',
+                          {'payment_method': 'mpesa', 'shipping_address': {'city': 'Nairobi'}}, headers)
+        recorder.call(session, '/orders', 'GET', '/orders', headers=headers)
+
+
+def summarize(recorder, seconds):
+    routes = {}
+    for route, samples in sorted(recorder.timings.items()):
+        routes[route] = {
+            'requests': len(samples),
+            'rps': round(len(samples) / seconds, 1),
+            'p50_ms': round(percentile(samples, 50), 1),
+            'p95_ms': round(percentile(samples, 95), 1),
+            'p99_ms': round(percentile(samples, 99), 1),
+            'errors': recorder.errors.get(route, 0)
+        }
+    return routes
+
+
+def compare(routes, baseline):
+    """Print changes against `baseline`, returning the routes that regressed"""
+    regressed = []
+    print(f"\n{'route':>16} {'rps':>18} {'p95 ms':>18}")
+    for route, now in routes.items():
+        before = baseline['routes'].get(route)
+        if not before:
+            print(f"{route:>16} {'(new)':>18}")
+            continue
+        rps_change = now['rps'] / before['rps'] - 1 if before['rps'] else 0
+        p95_change = now['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+        flag = ''
+        if rps_change < -MAX_REGRESSION or p95_change > MAX_REGRESSION:
+            regressed.append(route)
+            flag = '  ❌'
+        print(f"{route:>16} {before['rps']:>8} → {now['rps']:<8} {before['p95_ms']:>8} → {now['p95_ms']:<8}{flag}")
+    return regressed
+
+
+def main():
+    db = api.mongo.db
+    api.seed_products()
+    product_ids = [str(p['_id']) for p in db.products.find({'in_stock': True}, {'_id': 1})]
+    if BASE_URL:
+        make_session = lambda: HttpSession(BASE_URL)
+    else:
+        api.limiter.enabled = False
+        make_session = TestClientSession
+
+    # One customer per shopper, so carts and checkouts never contend with each other
+    password_hash = api.passwords.hash(PASSWORD)
+    run_id = ObjectId()
+    emails = [f'load-{run_id}-{i}@queenkoba.com' for i in range(CONCURRENCY)]
+    user_ids = db.users.insert_many([{
+        'username': f'load-{run_id}-{i}',
+        'email': email,
+        'password_hash': password_hash,
+        'role': 'customer',
+        'country': 'Kenya',
+        'preferred_currency': 'KES',
+        'cart': [],
+        'created_at': datetime.utcnow()
+    } for i, email in enumerate(emails)]).inserted_ids
+
+    print(f"{CONCURRENCY} shoppers for {SECONDS:.0f}s against {BASE_URL or 'the Flask test client'}; "
+          f"{BUY_RATIO:.0%} of sessions buy, {CHECKOUT_RATIO:.0%} of those check out\n")
+    recorder = Recorder()
+    try:
+        deadline = time.perf_counter() + SECONDS
+        threads = [threading.Thread(target=shopper, args=(recorder, make_session(), email, product_ids, deadline, i))
+                   for i, email in enumerate(emails)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+    finally:
+        db.orders.delete_many({'user_id': {'$in': [str(user_id) for user_id in user_ids]}})
+        db.users.delete_many({'_id': {'$in': user_ids}})
+
+    routes = summarize(recorder, seconds)
+    print(f"{'route':>16} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for route, row in routes.items():
+        print(f"{route:>16} {row['requests']:>9} {row['rps']:>8} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>7}")
+    total = sum(row['requests'] for row in routes.values())
+    print(f"{'all':>16} {total:>9} {total / seconds:>8.1f}")
+
+    result = {
+        'config': {
+            'concurrency': CONCURRENCY,
+            'seconds': SECONDS,
+            'buy_ratio': BUY_RATIO,
+            'checkout_ratio': CHECKOUT_RATIO,
+            'target': 'http' if BASE_URL else 'test_client',
+            'bcrypt_rounds': api.app.config['BCRYPT_ROUNDS']
+        },
+        'routes': routes
+    }
+
+    if '--save' in sys.argv:
+        with open(BASELINE, 'w') as baseline_file:
+            json.dump(result, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"\n✅ Baseline written to {BASELINE}")
+    elif '--compare' in sys.argv:
+        with open(BASELINE) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['config'] != result['config']:
+            print(f"\n⚠️ Baseline was recorded with {baseline['config']}")
+        regressed = compare(routes, baseline)
+        if regressed:
+            print(f"\n❌ Regressed: {', '.join(regressed)}")
+            sys.exit(1)
+        print("\n✅ No route regressed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""In-process product catalog cache.
+
+The catalog only changes through the admin product routes, so the storefront
+reads (`/products`, `/products/<id>`) are served from an immutable snapshot
+held in memory. Writers build a new snapshot and swap the reference, so readers
+never take a lock. Each snapshot carries a version number that is bumped on
+every change.
+
+Every worker process holds its own copy, and admin writes only patch the
+process that handled them, so snapshots also expire after `ttl` seconds to
+pick up changes made through other workers.
+"""
+import threading
+import time
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog at one version"""
+
+    def __init__(self, version, products):
+        self.version = version
+        self.products = tuple(products)
+        self.by_id = {p['_id']: p for p in self.products}
+        self.loaded_at = time.monotonic()
+
+
+class CatalogCache:
+    """Versioned catalog snapshot with write-through patching"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prepare(product):
+        product = dict(product)
+        product['_id'] = str(product['_id'])
+        return product
+
+    def _swap(self, products):
+        self._version += 1
+        self._snapshot = CatalogSnapshot(self._version, products)
+        return self._snapshot
+
+    def load(self, collection):
+        """(Re)load the whole catalog from the products collection"""
+        return self.replace(collection.find())
+
+    def replace(self, products):
+        """Swap in a freshly read list of product documents"""
+        with self._lock:
+            return self._swap(self._prepare(p) for p in products)
+
+    def fresh(self):
+        """Current snapshot if it has not expired, else None; never does I/O"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl:
+            self.hits += 1
+            return snapshot
+
+        self.misses += 1
+        return None
+
+    def snapshot(self, collection):
+        """Current snapshot, loading it on first use or after it expires"""
+        return self.fresh() or self.load(collection)
+
+    def all(self, collection):
+        return self.snapshot(collection).products
+
+    def get(self, collection, product_id):
+        return self.snapshot(collection).by_id.get(str(product_id))
+
+    def put(self, product):
+        """Insert or replace one product after an admin write"""
+        product = self._prepare(product)
+        with self._lock:
+            if self._snapshot is None:
+                return
+            products = list(self._snapshot.products)
+            if product['_id'] in self._snapshot.by_id:
+                index = next(i for i, p in enumerate(products) if p['_id'] == product['_id'])
+                products[index] = product
+            else:
+                products.append(product)
+            self._swap(products)
+
+    def remove(self, product_id):
+        """Drop one product after an admin delete"""
+        product_id = str(product_id)
+        with self._lock:
+            if self._snapshot is None:
+                return
+            self._swap(p for p in self._snapshot.products if p['_id'] != product_id)
+
+    def invalidate(self):
+        """Force the next read to reload from Mongo"""
+        with self._lock:
+            self._snapshot = None
+
+    @property
+    def version(self):
+        return self._version
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'version': self._version,
+            'products': len(snapshot.products) if snapshot else 0,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -18,7 +18,8 @@ collections_to_clear = [
     'reviews',
     'shipping_zones',
     'site_content',
-    'support_tickets'
+    'support_tickets',
+    'daily_stats'
 ]
 
 for collection in collections_to_clear:
@@ -14,7 +14,8 @@ def clear_all_data():
         # Clear all collections
         collections = [
             'products', 'orders', 'users', 'promotions', 
-            'reviews', 'shipping_zones', 'site_content', 'support_tickets'
+            'reviews', 'shipping_zones', 'site_content', 'support_tickets',
+            'daily_stats'
         ]
         
         results = {}
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Materialized per-day order rollups behind /admin/dashboard/kpis.
+
+One document per UTC day in `daily_stats`, keyed by 'YYYY-MM-DD', holds the
+order count, gross value and per-status / per-payment-status breakdowns for
+the orders created that day. Checkout and order status changes keep it up to
+date incrementally, so dashboard ranges are answered by summing a handful of
+small documents instead of scanning orders.
+
+Rebuild it from the orders collection with:
+
+    python daily_stats.py --backfill [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient, ReplaceOne
+
+
+def day_key(moment):
+    return moment.strftime('%Y-%m-%d')
+
+
+def _field(value):
+    """Status values become field names, so keep them path-safe"""
+    return str(value or 'unknown').replace('.', '_').replace('$', '_')
+
+
+def order_increment(order):
+    """(filter, update) that counts a new order in its day's rollup; upsert it"""
+    total = order.get('total_usd', 0)
+    payment = _field(order.get('payment_status'))
+    return (
+        {'_id': day_key(order['created_at'])},
+        {'$inc': {
+            'orders': 1,
+            'gross_usd': total,
+            f"statuses.{_field(order.get('order_status'))}": 1,
+            f'payments.{payment}.count': 1,
+            f'payments.{payment}.usd': total
+        }}
+    )
+
+
+def record_order(db, order):
+    """Count a newly created order in its day's rollup"""
+    day_filter, update = order_increment(order)
+    db.daily_stats.update_one(day_filter, update, upsert=True)
+
+
+def record_status_change(db, order, new_status):
+    """Move an order between status buckets; `order` is its state before the change"""
+    old_status = _field(order.get('order_status'))
+    new_status = _field(new_status)
+    if old_status == new_status:
+        return
+    db.daily_stats.update_one(
+        {'_id': day_key(order['created_at'])},
+        {'$inc': {f'statuses.{old_status}': -1, f'statuses.{new_status}': 1}},
+        upsert=True
+    )
+
+
+def backfill(db, start=None, end=None):
+    """Rebuild rollups for [start, end) from the orders collection"""
+    match = {}
+    if start or end:
+        match['created_at'] = {}
+        if start:
+            match['created_at']['$gte'] = start
+        if end:
+            match['created_at']['$lt'] = end
+
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': {
+                'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                'status': '$order_status',
+                'payment': '$payment_status'
+            },
+            'count': {'$sum': 1},
+            'usd': {'$sum': '$total_usd'}
+        }}
+    ]
+
+    days = {}
+    for row in db.orders.aggregate(pipeline):
+        day = days.setdefault(row['_id']['day'], {
+            '_id': row['_id']['day'], 'orders': 0, 'gross_usd': 0, 'statuses': {}, 'payments': {}
+        })
+        status = _field(row['_id'].get('status'))
+        payment = _field(row['_id'].get('payment'))
+        day['orders'] += row['count']
+        day['gross_usd'] += row['usd']
+        day['statuses'][status] = day['statuses'].get(status, 0) + row['count']
+        bucket = day['payments'].setdefault(payment, {'count': 0, 'usd': 0})
+        bucket['count'] += row['count']
+        bucket['usd'] += row['usd']
+
+    stale = {}
+    if start or end:
+        stale['_id'] = {}
+        if start:
+            stale['_id']['$gte'] = day_key(start)
+        if end:
+            stale['_id']['$lt'] = day_key(end)
+    db.daily_stats.delete_many(stale)
+
+    if days:
+        db.daily_stats.bulk_write([ReplaceOne({'_id': key}, doc, upsert=True) for key, doc in days.items()])
+    return len(days)
+
+
+def summarize(db, start, end):
+    """Totals across the rollups for days in [start, end] (inclusive dates)"""
+    totals = {'orders': 0, 'gross_usd': 0, 'statuses': {}, 'payments': {}}
+    for day in db.daily_stats.find({'_id': {'$gte': day_key(start), '$lte': day_key(end)}}):
+        totals['orders'] += day.get('orders', 0)
+        totals['gross_usd'] += day.get('gross_usd', 0)
+        for status, count in day.get('statuses', {}).items():
+            totals['statuses'][status] = totals['statuses'].get(status, 0) + count
+        for payment, bucket in day.get('payments', {}).items():
+            total = totals['payments'].setdefault(payment, {'count': 0, 'usd': 0})
+            total['count'] += bucket.get('count', 0)
+            total['usd'] += bucket.get('usd', 0)
+    return totals
+
+
+def _arg(name):
+    if name in sys.argv:
+        return datetime.strptime(sys.argv[sys.argv.index(name) + 1], '%Y-%m-%d')
+    return None
+
+
+if __name__ == '__main__':
+    if '--backfill' not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/queenkoba'))
+    db = client.get_default_database('queenkoba')
+
+    start = _arg('--from')
+    end = _arg('--to')
+    if end:
+        end += timedelta(days=1)
+
+    count = backfill(db, start, end)
+    print(f"✅ Rebuilt {count} daily rollups")
@@ -0,0 +1,131 @@
+"""Streaming NDJSON / CSV exports of orders and customers.
+
+Rows are produced lazily from a Mongo cursor and written out in small chunks
+by a generator response, so memory stays flat whatever the export size and
+the client starts receiving data straight away.
+
+Dates, ids and decimals are written exactly as the JSON API writes them, in
+NDJSON lines and CSV cells alike. CSV cells that a spreadsheet would read as
+a formula are prefixed with a quote.
+"""
+import csv
+import io
+from datetime import datetime
+
+from flask import Response, current_app
+
+from json_provider import plain_value
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_BATCH_SIZE = 1000
+
+# Rows written per chunk of the response body
+CHUNK_ROWS = 500
+
+SHIPPING_FIELDS = ('name', 'email', 'phone', 'address', 'city', 'postalCode', 'country')
+
+# One row per order line, with the order and its shipping address repeated
+ORDER_COLUMNS = [
+    'order_number', 'order_id', 'user_id', 'created_at', 'order_status',
+    'payment_status', 'payment_method', 'total_usd',
+    'item_product_id', 'item_product_name', 'item_quantity', 'item_price_per_item', 'item_total'
+] + [f'shipping_{field}' for field in SHIPPING_FIELDS]
+
+CUSTOMER_COLUMNS = [
+    'customer_id', 'name', 'username', 'email', 'phone', 'country',
+    'preferred_currency', 'status', 'created_at'
+]
+
+# Never read credentials or embedded arrays when exporting customers
+CUSTOMER_PROJECTION = {'password_hash': 0, 'cart': 0, 'orders': 0}
+
+# Leading characters that make a spreadsheet treat a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def order_rows(order):
+    """Flatten one order into a row per item"""
+    base = {
+        'order_number': str(order['_id']),
+        'order_id': order.get('order_id'),
+        'user_id': order.get('user_id'),
+        'created_at': plain_value(order.get('created_at')),
+        'order_status': order.get('order_status'),
+        'payment_status': order.get('payment_status'),
+        'payment_method': order.get('payment_method'),
+        'total_usd': plain_value(order.get('total_usd'))
+    }
+    address = order.get('shipping_address') or {}
+    for field in SHIPPING_FIELDS:
+        base[f'shipping_{field}'] = address.get(field)
+
+    items = order.get('items') or [{}]
+    for item in items:
+        row = dict(base)
+        row['item_product_id'] = item.get('product_id')
+        row['item_product_name'] = item.get('product_name')
+        row['item_quantity'] = item.get('quantity')
+        row['item_price_per_item'] = plain_value(item.get('price_per_item'))
+        row['item_total'] = plain_value(item.get('item_total'))
+        yield row
+
+
+def customer_rows(user):
+    yield {
+        'customer_id': str(user['_id']),
+        'name': user.get('name'),
+        'username': user.get('username'),
+        'email': user.get('email'),
+        'phone': user.get('phone'),
+        'country': user.get('country'),
+        'preferred_currency': user.get('preferred_currency'),
+        'status': user.get('status'),
+        'created_at': plain_value(user.get('created_at'))
+    }
+
+
+def _ndjson_chunks(rows, json):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) >= CHUNK_ROWS:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    pending = 0
+    for row in rows:
+        writer.writerow({column: _csv_cell(value) for column, value in row.items()})
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def export_response(name, export_format, rows, columns):
+    """Generator response streaming `rows` as an attachment"""
+    if export_format == 'csv':
+        body, mimetype = _csv_chunks(rows, columns), 'text/csv'
+    else:
+        # The body is generated after the request context is gone, so keep the provider now
+        body, mimetype = _ndjson_chunks(rows, current_app.json), 'application/x-ndjson'
+
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
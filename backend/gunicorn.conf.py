@@ -0,0 +1,64 @@
+"""gunicorn settings for the production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+WEB_CONCURRENCY worker processes each run GUNICORN_THREADS request threads.
+Keep MONGO_MIN_POOL_SIZE close to the thread count and MONGO_MAX_POOL_SIZE
+above it, so a worker's requests never queue for a connection in steady state.
+Behind a reverse proxy, set TRUSTED_PROXY_HOPS so rate limits see the real
+client address (see rate_limit.py).
+"""
+import os
+import shutil
+import sys
+
+from pymongo import MongoClient
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', str(os.cpu_count() or 2)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# The app, and with it the MongoClient, is imported in each worker after fork;
+# a client inherited from the master would share its sockets and monitor threads
+preload_app = False
+
+
+def on_starting(server):
+    """Reset shared metrics and reconcile indexes once per deploy, before any fork"""
+    from indexes import ensure_indexes
+
+    # Samples left by a previous master would otherwise be added to this one's
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/queenkoba'),
+                         serverSelectionTimeoutMS=int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')))
+    try:
+        for collection, result in ensure_indexes(client.get_default_database('queenkoba')).items():
+            for index in result['created']:
+                server.log.info('Created index %s.%s', collection, index)
+            for index, error in result['failed'].items():
+                server.log.warning('Index %s.%s failed: %s', collection, index, error)
+    except Exception as e:
+        server.log.warning('Skipped index reconciliation: %s', e)
+    finally:
+        client.close()
+
+
+def post_worker_init(worker):
+    """Run the app module's warm_up(), if it has one, before the worker accepts connections"""
+    module = sys.modules.get(worker.app.app_uri.split(':')[0])
+    warm_up = getattr(module, 'warm_up', None)
+    if warm_up is not None:
+        warm_up()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the aggregated /metrics"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Declarative registry of the MongoDB indexes the API relies on.
+
+`ensure_indexes` reconciles the registry against the database and is safe to
+run on every boot: indexes whose key pattern already exists are left alone.
+It can also be run by hand:
+
+    python indexes.py            # create anything missing
+    python indexes.py --report   # list missing and unused indexes
+"""
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from pagination import KEYSET_SORT
+
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        # Signup users have no username, so only string usernames must be unique
+        IndexModel([('username', ASCENDING)], name='username_unique', unique=True,
+                   partialFilterExpression={'username': {'$type': 'string'}}),
+        IndexModel([('role', ASCENDING)] + KEYSET_SORT, name='role_created_at'),
+        # Finds the carts to reprice when a product's price changes
+        IndexModel([('cart.product_id', ASCENDING)], name='cart_product_id'),
+    ],
+    'orders': [
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING)], name='user_id_created_at'),
+        IndexModel(KEYSET_SORT, name='created_at_id'),
+    ],
+    'reviews': [
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING)], name='status_created_at'),
+        IndexModel(KEYSET_SORT, name='created_at_id'),
+    ],
+    'promotions': [
+        IndexModel([('status', ASCENDING)], name='status'),
+    ],
+    'shipping_zones': [
+        IndexModel([('active', ASCENDING)], name='active'),
+    ],
+    'support_tickets': [
+        IndexModel(KEYSET_SORT, name='created_at_id'),
+    ],
+    'fx_rates': [
+        IndexModel([('fetched_at', DESCENDING)], name='fetched_at'),
+    ],
+}
+
+SLOW_QUERY_COLLECTION = 'slow_queries'
+
+# Collections that must be capped, with their size in bytes. A collection
+# cannot be made capped once it exists, so these are created before anything
+# writes to them.
+CAPPED_COLLECTIONS = {
+    SLOW_QUERY_COLLECTION: 32 * 1024 * 1024,
+}
+
+
+def _key(spec):
+    return tuple((field, int(direction)) for field, direction in spec)
+
+
+def _existing_keys(collection):
+    """Map of key pattern -> index name for one collection"""
+    return {_key(info['key']): name for name, info in collection.index_information().items()}
+
+
+def ensure_capped(db, capped=CAPPED_COLLECTIONS):
+    """Create the capped collections that do not exist yet.
+
+    Returns {collection: error} for those that exist but are not capped.
+    """
+    failed = {}
+    for name, size in capped.items():
+        try:
+            db.create_collection(name, capped=True, size=size)
+        except CollectionInvalid:
+            if not db[name].options().get('capped'):
+                failed[name] = 'exists and is not capped'
+    return failed
+
+
+def ensure_indexes(db, registry=INDEXES):
+    """Create the capped collections and every registered index that are missing.
+
+    Returns {collection: {'created': [...], 'failed': {name: error}}}. Failures
+    (for example duplicate emails blocking a unique index) are reported rather
+    than raised so a bad index never stops the API from booting.
+    """
+    results = {name: {'created': [], 'failed': {'capped': error}}
+               for name, error in ensure_capped(db).items()}
+    for name, models in registry.items():
+        collection = db[name]
+        existing = _existing_keys(collection)
+        created, failed = [], {}
+
+        for model in models:
+            spec = model.document
+            if _key(spec['key'].items()) in existing:
+                continue
+            try:
+                collection.create_indexes([model])
+                created.append(spec['name'])
+            except OperationFailure as e:
+                failed[spec['name']] = str(e)
+
+        results[name] = {'created': created, 'failed': failed}
+    return results
+
+
+def index_report(db, registry=INDEXES):
+    """List registered indexes that are missing and existing ones never used.
+
+    Usage comes from $indexStats, so "unused" means no operations since the
+    server last restarted.
+    """
+    report = {}
+    for name, models in registry.items():
+        collection = db[name]
+        existing = _existing_keys(collection)
+        declared = {_key(m.document['key'].items()) for m in models}
+
+        missing = [m.document['name'] for m in models
+                   if _key(m.document['key'].items()) not in existing]
+        undeclared = [index for key, index in existing.items()
+                      if key not in declared and index != '_id_']
+        unused = [stat['name'] for stat in collection.aggregate([{'$indexStats': {}}])
+                  if stat['accesses']['ops'] == 0 and stat['name'] != '_id_']
+
+        report[name] = {'missing': missing, 'unused': sorted(unused), 'undeclared': undeclared}
+    return report
+
+
+if __name__ == '__main__':
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/queenkoba'))
+    db = client.get_default_database('queenkoba')
+
+    if '--report' in sys.argv:
+        for collection, entry in index_report(db).items():
+            print(f"{collection}:")
+            print(f"   missing:    {', '.join(entry['missing']) or '-'}")
+            print(f"   unused:     {', '.join(entry['unused']) or '-'}")
+            print(f"   undeclared: {', '.join(entry['undeclared']) or '-'}")
+    else:
+        for collection, result in ensure_indexes(db).items():
+            for index in result['created']:
+                print(f"✅ {collection}.{index} created")
+            for index, error in result['failed'].items():
+                print(f"❌ {collection}.{index} failed: {error}")
+        print("Indexes up to date")
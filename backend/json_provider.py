@@ -0,0 +1,78 @@
+"""Flask JSON provider backed by orjson.
+
+Views can hand Mongo documents to jsonify() as they come out of the driver:
+
+    ObjectId              '65f0c0ffee...'
+    datetime (naive UTC)  '2026-10-18T09:30:00Z'
+    Decimal128, Decimal   '12.50'
+
+Nested documents and lists are walked by orjson itself, so views no longer
+copy documents to stringify their ids. Keys are sorted and the output is
+compact, like Flask's default provider; jsonify() indents it in debug mode.
+
+Unlike the default provider, datetimes are written as ISO 8601 rather than
+HTTP dates, and non-ASCII text is sent as UTF-8 rather than \\u escapes.
+"""
+import decimal
+from datetime import datetime, timedelta
+
+import orjson
+from bson import Decimal128, ObjectId
+from flask.json.provider import JSONProvider
+
+
+def _default(value):
+    """Types orjson does not encode natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def plain_value(value):
+    """`value` as the provider writes it, for callers that need text rather than JSON"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None or value.utcoffset() == timedelta(0):
+            return value.replace(tzinfo=None).isoformat() + 'Z'
+        return value.isoformat()
+    if isinstance(value, (ObjectId, Decimal128, decimal.Decimal)):
+        return _default(value)
+    return value
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that encodes with orjson and understands BSON types"""
+
+    sort_keys = True
+    compact = None
+    mimetype = 'application/json'
+
+    def _options(self, indent=False):
+        options = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def encode(self, obj, indent=False):
+        """`obj` as UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs):
+        # json.dumps keywords (separators, indent...) are accepted for
+        # compatibility and ignored: the output is always compact
+        return self.encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, indent) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Strip the legacy embedded `orders` arrays from user documents.
+
+Orders are linked to their customer through the indexed `orders.user_id`
+field; the per-user array of order ids only duplicated that and grew with
+every purchase. Before removing the arrays this checks that every id they
+hold exists in the orders collection for the same user, and refuses to strip
+a user whose array references orders that cannot be found (pass --force to
+strip anyway).
+
+    python migrate_user_orders.py            # report what would change
+    python migrate_user_orders.py --apply    # strip the arrays
+"""
+import os
+import sys
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import MongoClient
+
+BATCH_SIZE = 500
+
+
+def _object_ids(order_ids):
+    ids = []
+    for order_id in order_ids or []:
+        try:
+            ids.append(ObjectId(order_id))
+        except (InvalidId, TypeError):
+            continue
+    return ids
+
+
+def missing_orders(db, user):
+    """Ids in a user's embedded array with no matching order for that user"""
+    ids = _object_ids(user.get('orders'))
+    found = {str(o['_id']) for o in db.orders.find(
+        {'_id': {'$in': ids}, 'user_id': str(user['_id'])}, {'_id': 1}
+    )}
+    return [order_id for order_id in user.get('orders') or [] if str(order_id) not in found]
+
+
+def strip_embedded_orders(db, apply=False, force=False):
+    """Returns (users_with_arrays, users_stripped, {user_id: missing order ids})"""
+    total, stripped, problems = 0, 0, {}
+    ready = []
+
+    def flush():
+        nonlocal stripped
+        if apply and ready:
+            stripped += db.users.update_many(
+                {'_id': {'$in': ready}}, {'$unset': {'orders': ''}}
+            ).modified_count
+        ready.clear()
+
+    for user in db.users.find({'orders': {'$exists': True}}, {'orders': 1}).batch_size(BATCH_SIZE):
+        total += 1
+        missing = missing_orders(db, user)
+        if missing:
+            problems[str(user['_id'])] = missing
+            if not force:
+                continue
+        ready.append(user['_id'])
+        if len(ready) >= BATCH_SIZE:
+            flush()
+    flush()
+    return total, stripped, problems
+
+
+if __name__ == '__main__':
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/queenkoba'))
+    db = client.get_default_database('queenkoba')
+
+    apply = '--apply' in sys.argv
+    total, stripped, problems = strip_embedded_orders(db, apply=apply, force='--force' in sys.argv)
+
+    print(f"Users with an embedded orders array: {total}")
+    for user_id, missing in problems.items():
+        print(f"⚠️ User {user_id} references {len(missing)} order(s) not in the orders collection")
+    if apply:
+        print(f"✅ Stripped the array from {stripped} users")
+    else:
+        print("Dry run; pass --apply to strip the arrays")
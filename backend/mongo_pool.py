@@ -0,0 +1,107 @@
+"""Mongo connection pool settings and warm-up for pre-forking servers.
+
+Each worker process owns one MongoClient, sized by four config values:
+
+    MONGO_MAX_POOL_SIZE                  connections per server, at most
+    MONGO_MIN_POOL_SIZE                  connections kept open even when idle
+    MONGO_WAIT_QUEUE_TIMEOUT_MS          how long a request may wait for a free
+                                         connection before failing
+    MONGO_SERVER_SELECTION_TIMEOUT_MS    how long to wait for a usable server
+
+A client must not be shared across fork(), so the production entry point
+imports the app inside each worker. Before the worker accepts traffic,
+prefill() opens the minimum number of connections, so the first requests
+after a deploy do not pay for TCP and TLS handshakes.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo.monitoring import ConnectionPoolListener
+
+# Flask config key -> MongoClient keyword
+POOL_SETTINGS = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+}
+
+
+def pool_options(config):
+    """MongoClient keyword arguments for the pool settings present in `config`"""
+    return {option: config[key] for key, option in POOL_SETTINGS.items() if config.get(key) is not None}
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """Counts open connections and checkout outcomes from the driver's pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = set()
+        self.checkouts = 0
+        self.checkout_failures = {}
+
+    @property
+    def open(self):
+        return len(self._open)
+
+    def connection_ready(self, event):
+        with self._lock:
+            self._open.add((event.address, event.connection_id))
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._open.discard((event.address, event.connection_id))
+
+    def connection_checked_out(self, event):
+        self.checkouts += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def stats(self):
+        return {
+            'open': self.open,
+            'checkouts': self.checkouts,
+            'checkout_failures': dict(self.checkout_failures)
+        }
+
+
+def prefill(client, monitor, size, timeout=10):
+    """Open at least `size` pooled connections, returning how many are open.
+
+    Concurrent pings make the handshakes happen in parallel; the driver's own
+    minPoolSize maintenance tops up whatever they did not open.
+    """
+    client.admin.command('ping')
+    if size > 1:
+        with ThreadPoolExecutor(size) as workers:
+            list(workers.map(lambda _: client.admin.command('ping'), range(size)))
+
+    deadline = time.monotonic() + timeout
+    while monitor.open < size and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return monitor.open
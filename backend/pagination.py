@@ -0,0 +1,93 @@
+"""Keyset pagination over (created_at, _id).
+
+Admin lists are sorted newest first on `created_at` with `_id` as a tie
+breaker. The position after the last row of a page is handed to the client as
+an opaque `after` cursor, and the next page starts with a range query on that
+pair. Each page is therefore a bounded index scan, no matter how deep the
+client has paged.
+
+Legacy documents without `created_at` sort after every dated one, so the
+last pages walk them by `_id` alone.
+"""
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Sort order every paginated list uses; the backing indexes must match it
+KEYSET_SORT = [('created_at', -1), ('_id', -1)]
+
+
+def parse_page_size(value):
+    """Validate a `page_size` query parameter, raising ValueError if invalid.
+
+    Sizes above MAX_PAGE_SIZE are capped rather than rejected.
+    """
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        page_size = 0
+    if page_size < 1:
+        raise ValueError(f'page_size must be an integer between 1 and {MAX_PAGE_SIZE}')
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def encode_cursor(doc):
+    """Opaque cursor pointing just after `doc`"""
+    created_at = doc.get('created_at')
+    payload = {
+        't': created_at.isoformat() if created_at else None,
+        'i': str(doc['_id']),
+        'o': isinstance(doc['_id'], ObjectId)
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Turn a cursor back into (created_at, _id), raising ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        created_at = datetime.fromisoformat(payload['t']) if payload['t'] else None
+        doc_id = ObjectId(payload['i']) if payload['o'] else payload['i']
+    except Exception as e:
+        raise ValueError('Invalid cursor') from e
+    return created_at, doc_id
+
+
+def keyset_filter(query, after=None):
+    """Add the "strictly after this cursor" condition to a query"""
+    if not after:
+        return dict(query)
+
+    created_at, doc_id = decode_cursor(after)
+    if created_at is None:
+        position = {'created_at': None, '_id': {'$lt': doc_id}}
+    else:
+        position = {'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': doc_id}},
+            {'created_at': None}
+        ]}
+    # $and keeps any $or the caller's query already has
+    return {'$and': [query, position]} if query else position
+
+
+def keyset_page(collection, query, after=None, page_size=DEFAULT_PAGE_SIZE, projection=None):
+    """Fetch one page of `query`, returning (docs, next_cursor)"""
+    query = keyset_filter(query, after)
+
+    # One extra row tells us whether another page exists
+    docs = list(collection.find(query, projection).sort(KEYSET_SORT).limit(page_size + 1))
+    if len(docs) <= page_size:
+        return docs, None
+
+    docs = docs[:page_size]
+    return docs, encode_cursor(docs[-1])
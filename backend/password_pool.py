@@ -0,0 +1,112 @@
+"""Bounded worker pool for bcrypt hashing and verification.
+
+bcrypt is deliberately slow (~250 ms at cost 12), so running it inline lets a
+login burst occupy every request thread. All password work goes through a
+small dedicated executor instead: at most `workers` hashes run at once, at
+most `max_pending` more may wait, and anything beyond that is refused straight
+away with PasswordPoolBusy so the route can answer 503 while catalog traffic
+keeps flowing.
+
+The cost factor is configurable. Hashes made at a different cost still verify,
+and `needs_rehash` tells login to upgrade them to the current cost.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+
+class PasswordPoolBusy(Exception):
+    """The pool is saturated or too slow; the request should be retried later"""
+
+
+def hash_rounds(stored_hash):
+    """Cost factor encoded in a bcrypt hash ('$2b$12$...'), or None if unreadable"""
+    try:
+        return int(stored_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordPool:
+    """bcrypt on a bounded executor with a queue-depth limit"""
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=2, max_pending=32, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        # One slot per running or queued job
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        """Queue `fn(*args)` on the pool, raising PasswordPoolBusy if it is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy('Too many password operations in progress')
+        with self._lock:
+            self._in_flight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, fn, *args):
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timed_out += 1
+            raise PasswordPoolBusy('Password operation timed out')
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def verify(self, password, stored_hash):
+        if not stored_hash:
+            return False
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+    def needs_rehash(self, stored_hash):
+        return hash_rounds(stored_hash) != self.rounds
+
+    def rehash_later(self, password, save):
+        """Hash `password` at the current cost in the background and pass it to `save`.
+
+        Skipped silently when the pool is busy; the next login will try again.
+        """
+        def work():
+            save(self._hash(password))
+        try:
+            self.submit(work)
+        except PasswordPoolBusy:
+            pass
+
+    def stats(self):
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'in_flight': self._in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Materialized per-currency product prices.
+
+Every product stores its price in each supported currency under `prices`,
+stamped with the `rate_version` of the exchange-rate snapshot they were
+computed from, so storefront reads never convert. When a new snapshot is
+published, `recompute_prices` brings every stale product up to date with one
+vectorized pass over the catalog and a single bulk_write.
+
+Admins can pin a currency to a fixed amount (for example a round KES price).
+Pinned amounts live in `pinned_prices` and are carried over untouched on every
+recompute.
+
+Recompute by hand with:
+
+    python product_prices.py --recompute
+"""
+import os
+import sys
+from datetime import datetime
+
+from pymongo import MongoClient, UpdateOne
+
+from app.utils.exchange_rates import CURRENCY_COUNTRIES, CURRENCY_SYMBOLS, rates
+
+PRICED_CURRENCIES = tuple(c for c in rates.currencies if c != 'USD')
+
+# Everything a recompute needs to read from a product
+PRICE_FIELDS = {'base_price_usd': 1, 'pinned_prices': 1, 'updated_at': 1}
+
+
+def price_entry(currency, amount, pinned=False):
+    entry = {
+        'amount': round(float(amount), 2),
+        'symbol': CURRENCY_SYMBOLS[currency],
+        'country': CURRENCY_COUNTRIES[currency]
+    }
+    if pinned:
+        entry['pinned'] = True
+    return entry
+
+
+def parse_pins(prices):
+    """Read {currency: {'amount': x}} (or {currency: x}) into {currency: amount}, raising ValueError"""
+    if not isinstance(prices, dict):
+        raise ValueError('prices must be an object keyed by currency')
+    pins = {}
+    for currency, value in prices.items():
+        currency = currency.upper()
+        if currency not in PRICED_CURRENCIES:
+            raise ValueError(f'Unsupported currency: {currency}')
+        amount = value.get('amount') if isinstance(value, dict) else value
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid {currency} amount')
+        if amount < 0:
+            raise ValueError(f'Invalid {currency} amount')
+        pins[currency] = round(amount, 2)
+    return pins
+
+
+def _prices_from_row(row, pins):
+    prices = {currency: price_entry(currency, amount) for currency, amount in zip(PRICED_CURRENCIES, row)}
+    for currency, amount in (pins or {}).items():
+        if currency in prices:
+            prices[currency] = price_entry(currency, amount, pinned=True)
+    return prices
+
+
+def price_fields(base_price_usd, pins=None, snapshot=None):
+    """`prices` and `rate_version` for one product, to $set or insert alongside it"""
+    snapshot = snapshot or rates.snapshot
+    row = rates.price_table([base_price_usd], PRICED_CURRENCIES, snapshot=snapshot)[0]
+    return {
+        'prices': _prices_from_row(row, pins),
+        'pinned_prices': dict(pins or {}),
+        'rate_version': snapshot.version
+    }
+
+
+def recompute_prices(db, snapshot=None):
+    """Reprice every product not yet at `snapshot`'s version; returns the number updated.
+
+    Each update is conditional on the product's updated_at, so an admin edit
+    that lands mid-recompute (and already priced the product itself) wins.
+    """
+    snapshot = snapshot or rates.snapshot
+    stale = list(db.products.find({'rate_version': {'$ne': snapshot.version}}, PRICE_FIELDS))
+    if not stale:
+        return 0
+
+    table = rates.price_table([p.get('base_price_usd', 0) for p in stale], PRICED_CURRENCIES, snapshot=snapshot)
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {'_id': product['_id'], 'updated_at': product.get('updated_at')},
+            {'$set': {
+                'prices': _prices_from_row(row, product.get('pinned_prices')),
+                'rate_version': snapshot.version,
+                'prices_updated_at': now
+            }}
+        )
+        for product, row in zip(stale, table)
+    ]
+    return db.products.bulk_write(operations, ordered=False).modified_count
+
+
+if __name__ == '__main__':
+    if '--recompute' not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/queenkoba'))
+    db = client.get_default_database('queenkoba')
+
+    # Price against the last persisted rates, as the API would
+    latest = db.fx_rates.find_one({}, sort=[('fetched_at', -1)])
+    if latest:
+        from app.utils.rate_refresher import StaticRateSource, RateRefresher
+        RateRefresher(StaticRateSource(latest['rates']), db=db).load_last_good()
+
+    count = recompute_prices(db)
+    print(f"✅ Repriced {count} products at rate version {rates.snapshot.version}")
@@ -129,4 +129,5 @@ if __name__ == '__main__':
     print("🚀 Starting server... (Press Ctrl+C to stop)")
     print("="*50 + "\n")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; in production serve app with gunicorn
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,484 @@
+"""ASGI variant of the storefront API on an async Mongo driver (motor).
+
+The routes that spend their time waiting on Mongo - catalog reads, the cart,
+checkout and order history - are served here as coroutines, so one worker
+keeps thousands of requests in flight instead of one per thread. They return
+exactly the same JSON (same keys, same encoder, same status codes) as their
+Flask counterparts in queenkoba_mongodb. Both call the same storefront helpers
+for pricing, cart updates and order building, and share the catalog cache
+and response cache; only the Mongo I/O is written twice.
+
+Every other path (auth, admin, reviews, exports...) is handed to the Flask
+app through a WSGI adapter, so this app serves the whole API:
+
+    uvicorn queenkoba_async:app --host 0.0.0.0 --port 5000 --workers 4
+
+Logins stay on the Flask side on purpose: they are bound by bcrypt on the
+password pool, not by Mongo round trips.
+
+The async routes record the same request and Mongo metrics under the same
+route labels as the Flask views, and enforce whatever rate limits those
+views carry, so the two apps can be compared request for request.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import ExpiredSignatureError, InvalidTokenError
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags, quote_etag
+
+import daily_stats
+import queenkoba_mongodb as sync_api
+import request_metrics
+from indexes import ensure_indexes
+from mongo_pool import pool_options
+from queenkoba_mongodb import catalog_cache, response_cache
+from rate_limit import TOO_MANY_REQUESTS, retry_after
+from storefront import (ProductNotFound, build_order, cart_claim, cart_currency, cart_line_ops, cart_product_fields,
+                        cart_quantity_ops, cart_removal, cart_restore, cart_subtotal_op, order_view,
+                        parse_cart_quantities, parse_json_body, parse_object_ids, parse_product_view, parse_quantity, placed_order,
+                        price_cart, products_cache_key, products_payload, shape_product, unapplied_cart_lines)
+
+flask_app = sync_api.app
+
+# Threads the WSGI adapter runs Flask views on
+WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', '10'))
+
+# Set on startup, once there is an event loop to bind the client to
+client = None
+db = None
+
+# ========== HELPER FUNCTIONS ==========
+def json_response(payload, status=200):
+    """Response encoded exactly like flask.jsonify"""
+    body = flask_app.json.encode(payload) + b'\n'
+    return Response(body, status_code=status, media_type=flask_app.json.mimetype)
+
+async def request_json(request):
+    """Body parsed like Flask's get_json(silent=True): None unless it is valid JSON sent as JSON"""
+    media_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if media_type != 'application/json' and not (media_type.startswith('application/') and media_type.endswith('+json')):
+        return None
+    try:
+        return flask_app.json.loads(await request.body())
+    except ValueError:
+        return None
+
+def client_address(request):
+    """Client IP as the Flask app sees it, trusting TRUSTED_PROXY_HOPS X-Forwarded-For entries like ProxyFix"""
+    hops = flask_app.config['TRUSTED_PROXY_HOPS']
+    forwarded = ','.join(request.headers.getlist('x-forwarded-for'))
+    if hops and forwarded:
+        values = [value.strip() for value in forwarded.split(',')]
+        if len(values) >= hops:
+            return values[-hops]
+    return request.client.host if request.client else 'unknown'
+
+def cached_response(request, entry):
+    """200 with the cached body, or 304 when the client already has it"""
+    headers = {'ETag': quote_etag(entry.etag), 'Cache-Control': 'no-cache'}
+    if parse_etags(request.headers.get('if-none-match')).contains(entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=flask_app.json.mimetype, headers=headers)
+
+def jwt_required(endpoint):
+    """Verify the Bearer access token like flask_jwt_extended, exposing it on request.state"""
+    @wraps(endpoint)
+    async def wrapper(request):
+        header = request.headers.get('authorization')
+        if not header:
+            return json_response({'msg': 'Missing Authorization Header'}, 401)
+        scheme, _, token = header.partition(' ')
+        if scheme != 'Bearer' or not token:
+            return json_response({'msg': "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}, 422)
+
+        try:
+            with flask_app.app_context():
+                claims = decode_token(token)
+        except ExpiredSignatureError:
+            return json_response({'msg': 'Token has expired'}, 401)
+        except (InvalidTokenError, JWTExtendedException) as e:
+            return json_response({'msg': str(e)}, 422)
+        if claims.get('type') != 'access':
+            return json_response({'msg': 'Only non-refresh tokens are allowed'}, 422)
+
+        request.state.claims = claims
+        request.state.user_id = claims[flask_app.config['JWT_IDENTITY_CLAIM']]
+        return await endpoint(request)
+    return wrapper
+
+def claim(request, name, default=None):
+    value = request.state.claims.get(name)
+    return default if value is None else value
+
+def preferred_currency(request):
+    return cart_currency(claim(request, 'preferred_currency', 'KES'))
+
+async def catalog_snapshot():
+    """Fresh catalog snapshot, reloading it through motor once it expires"""
+    snapshot = catalog_cache.fresh()
+    if snapshot is None:
+        snapshot = catalog_cache.replace(await db.products.find().to_list(None))
+    return snapshot
+
+async def fetch_products_by_id(product_ids, projection=None):
+    """Load many products with a single $in query, keyed by string id"""
+    object_ids = parse_object_ids(product_ids)
+    if not object_ids:
+        return {}
+
+    products = await db.products.find({'_id': {'$in': object_ids}}, projection).to_list(None)
+    return {str(p['_id']): p for p in products}
+
+def supports_transactions():
+    topology = client.topology_description.topology_type_name
+    return topology in ('ReplicaSetWithPrimary', 'Sharded')
+
+async def commit_order(user_id, cart, order):
+    """Async twin of queenkoba_mongodb.commit_order, with the same guarantees"""
+    cart_filter, cart_update = cart_claim(user_id, cart, order)
+    day_filter, day_update = daily_stats.order_increment(order)
+
+    if supports_transactions():
+        async def write_order(session):
+            result = await db.users.update_one(cart_filter, cart_update, session=session)
+            if result.matched_count == 0:
+                return False
+            await db.orders.insert_one(order, session=session)
+            return True
+
+        async with await client.start_session() as session:
+            if not await session.with_transaction(write_order):
+                return False
+    else:
+        result = await db.users.update_one(cart_filter, cart_update)
+        if result.matched_count == 0:
+            return False
+
+        try:
+            await db.orders.insert_one(order)
+        except Exception:
+            await db.users.update_one(*cart_restore(user_id, cart))
+            raise
+
+    # The rollup can be rebuilt from orders, so never fail a placed order over it
+    try:
+        await db.daily_stats.update_one(day_filter, day_update, upsert=True)
+    except Exception:
+        flask_app.logger.exception('Failed to update daily_stats for order %s', order['order_id'])
+    return True
+
+# ========== PRODUCT ROUTES ==========
+async def get_products(request):
+    try:
+        fields, currency = parse_product_view(request.query_params)
+        snapshot = await catalog_snapshot()
+
+        # Same key and encoding as the Flask route, so both share cached bodies
+        entry = response_cache.entry(
+            products_cache_key(fields, currency),
+            lambda: products_payload(snapshot, fields, currency),
+            flask_app.json.dumps,
+            version=snapshot.version
+        )
+        return cached_response(request, entry)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+async def get_product(request):
+    product_id = request.path_params['product_id']
+    if not ObjectId.is_valid(product_id):
+        return json_response({'error': 'Invalid product ID'}, 400)
+
+    try:
+        fields, currency = parse_product_view(request.query_params)
+        product = (await catalog_snapshot()).by_id.get(product_id)
+        if not product:
+            return json_response({'error': 'Product not found'}, 404)
+
+        return json_response({
+            'status': 'success',
+            'product': shape_product(product, fields, currency)
+        })
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+# ========== CART ROUTES ==========
+@jwt_required
+async def get_cart(request):
+    try:
+        user = await db.users.find_one(
+            {'_id': ObjectId(request.state.user_id)},
+            {'cart': 1, 'cart_subtotal_usd': 1}
+        )
+
+        if not user:
+            return json_response({'error': 'User not found'}, 404)
+
+        cart_items = user.get('cart', [])
+        currency = preferred_currency(request)
+
+        products = await fetch_products_by_id(
+            [item['product_id'] for item in cart_items],
+            cart_product_fields(currency)
+        )
+        total = price_cart(cart_items, products, currency, user.get('cart_subtotal_usd'))
+
+        return json_response({
+            'status': 'success',
+            'cart': cart_items,
+            'total': total
+        })
+
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+@jwt_required
+async def add_to_cart(request):
+    try:
+        user_id = request.state.user_id
+        data = parse_json_body(await request_json(request))
+
+        if not data.get('product_id') or not data.get('quantity'):
+            return json_response({'error': 'Product ID and quantity required'}, 400)
+        quantity = parse_quantity(data['quantity'])
+
+        product = (await catalog_snapshot()).by_id.get(str(data['product_id']))
+        if not product:
+            return json_response({'error': 'Product not found'}, 404)
+
+        operations = cart_line_ops(user_id, product, quantity, increment=True) + [cart_subtotal_op(user_id)]
+        result = await db.users.bulk_write(operations)
+        if result.matched_count == 0:
+            return json_response({'error': 'User not found'}, 404)
+        if result.matched_count == 1:
+            # Only the subtotal matched: another request pushed the same line between our two statements
+            result = await db.users.bulk_write(operations)
+            if result.matched_count < 2:
+                return json_response({'error': 'Cart changed during update, please try again'}, 409)
+
+        return json_response({
+            'status': 'success',
+            'message': 'Product added to cart'
+        })
+
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+@jwt_required
+async def set_cart_quantities(request):
+    try:
+        user_id = request.state.user_id
+        data = parse_json_body(await request_json(request))
+
+        snapshot = await catalog_snapshot()
+        lines = parse_cart_quantities(data.get('items'), snapshot.by_id.get)
+
+        result = await db.users.bulk_write(cart_quantity_ops(user_id, lines) + [cart_subtotal_op(user_id)])
+        if result.matched_count != len(lines) + 1:
+            # Another request changed the cart mid-batch; redo the lines that did not land
+            user = await db.users.find_one({'_id': ObjectId(user_id)}, {'cart.product_id': 1, 'cart.quantity': 1})
+            if not user:
+                return json_response({'error': 'User not found'}, 404)
+            pending = unapplied_cart_lines(user.get('cart', []), lines)
+            if pending:
+                result = await db.users.bulk_write(cart_quantity_ops(user_id, pending) + [cart_subtotal_op(user_id)])
+                if result.matched_count != len(pending) + 1:
+                    return json_response({'error': 'Cart changed during update, please try again'}, 409)
+
+        return json_response({
+            'status': 'success',
+            'message': 'Cart updated',
+            # Distinct products set or removed; a repeated product counts once
+            'lines_changed': len(lines)
+        })
+
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except ProductNotFound as e:
+        return json_response({'error': str(e)}, 404)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+@jwt_required
+async def remove_from_cart(request):
+    try:
+        user = await db.users.find_one_and_update(
+            *cart_removal(request.state.user_id, request.path_params['product_id']),
+            projection={'cart.product_id': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not user:
+            return json_response({'error': 'User not found'}, 404)
+
+        return json_response({
+            'status': 'success',
+            'message': 'Product removed from cart',
+            'cart_count': len(user.get('cart', []))
+        })
+
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+# ========== CHECKOUT & ORDERS ==========
+@jwt_required
+async def checkout(request):
+    try:
+        user_id = request.state.user_id
+        data = parse_json_body(await request_json(request))
+
+        user = await db.users.find_one({'_id': ObjectId(user_id)}, {'cart': 1})
+        if not user:
+            return json_response({'error': 'User not found'}, 404)
+
+        cart = user.get('cart', [])
+        if len(cart) == 0:
+            return json_response({'error': 'Cart is empty'}, 400)
+
+        currency = preferred_currency(request)
+        products = await fetch_products_by_id(
+            [item['product_id'] for item in cart],
+            cart_product_fields(currency)
+        )
+
+        order = build_order(user_id, cart, products, currency, data)
+
+        if not await commit_order(user_id, cart, order):
+            return json_response({'error': 'Cart changed during checkout, please try again'}, 409)
+
+        return json_response(placed_order(order))
+
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+@jwt_required
+async def get_orders(request):
+    try:
+        orders = await db.orders.find({'user_id': request.state.user_id}).sort('created_at', -1).to_list(None)
+
+        return json_response({
+            'status': 'success',
+            'count': len(orders),
+            'orders': orders
+        })
+
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+@jwt_required
+async def get_order(request):
+    try:
+        order = await db.orders.find_one({
+            '_id': ObjectId(request.path_params['order_id']),
+            'user_id': request.state.user_id
+        })
+
+        if not order:
+            return json_response({'error': 'Order not found'}, 404)
+
+        return json_response({
+            'status': 'success',
+            'order': order_view(order, claim(request, 'preferred_currency', 'KES'))
+        })
+
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+# ========== APP ==========
+@asynccontextmanager
+async def lifespan(app):
+    global client, db
+    client = AsyncIOMotorClient(flask_app.config['MONGO_URI'], **pool_options(flask_app.config),
+                                event_listeners=[request_metrics.CommandMetrics(), sync_api.slow_queries])
+    db = client.get_default_database('queenkoba')
+
+    try:
+        # Open both pools, load rates and warm the catalog before serving
+        await asyncio.gather(*(db.command('ping') for _ in range(flask_app.config['MONGO_MIN_POOL_SIZE'])))
+        # Idempotent, so every worker may run it; gunicorn does it once in its master instead
+        await asyncio.to_thread(ensure_indexes, sync_api.mongo.db)
+        await asyncio.to_thread(sync_api.warm_up)
+    except Exception as e:
+        flask_app.logger.warning('Starting without MongoDB: %s', e)
+    sync_api.rate_refresher.start()
+
+    yield
+
+    sync_api.rate_refresher.stop()
+    client.close()
+
+# Flask-CORS covers the mounted app; the async routes need their own headers
+CORS = [Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])]
+
+def flask_view(rule, method):
+    """The Flask view serving `rule` and `method`"""
+    for flask_rule in flask_app.url_map.iter_rules():
+        if flask_rule.rule == rule and method in flask_rule.methods:
+            return flask_app.view_functions[flask_rule.endpoint]
+    raise LookupError(f'No Flask route for {method} {rule}')
+
+def rate_limited(endpoint, view):
+    """Enforce the rate limits `view` carries (see RateLimiter.limit), if any, before `endpoint`"""
+    if not hasattr(view, 'rate_limits'):
+        return endpoint
+    name, error_key, rules = view.rate_limits
+    limiter = sync_api.limiter
+
+    @wraps(endpoint)
+    async def wrapper(request):
+        if limiter.enabled:
+            body = None
+            if any(scope != 'ip' for scope in rules):
+                body = await request_json(request)
+                body = body if isinstance(body, dict) else {}
+            # The backend may be Redis, so keep its round trip off the event loop
+            wait = await asyncio.to_thread(limiter.check, name, rules, client_address(request), body)
+            limiter.count(wait)
+            if wait > 0:
+                response = json_response({error_key: TOO_MANY_REQUESTS}, 429)
+                response.headers['Retry-After'] = retry_after(wait)
+                return response
+        return await endpoint(request)
+    return wrapper
+
+def route(path, endpoint, method):
+    # Metrics are labelled with the Flask rule, so both apps report the same routes
+    rule = path.replace('{', '<').replace('}', '>')
+    endpoint = request_metrics.instrument(rate_limited(endpoint, flask_view(rule, method)), rule)
+    return Route(path, endpoint, methods=[method], middleware=CORS)
+
+routes = [
+    route('/products', get_products, 'GET'),
+    route('/products/{product_id}', get_product, 'GET'),
+    route('/cart', get_cart, 'GET'),
+    route('/cart/add', add_to_cart, 'POST'),
+    route('/cart/quantities', set_cart_quantities, 'PUT'),
+    route('/cart/remove/{product_id}', remove_from_cart, 'DELETE'),
+    route('/checkout', checkout, 'POST'),
+    route('/orders', get_orders, 'GET'),
+    route('/orders/{order_id}', get_order, 'GET'),
+    # Everything else, including CORS preflights, is answered by the Flask app
+    Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_WORKERS)),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan)
@@ -1,68 +1,257 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, current_app, jsonify, request, stream_with_context
 from flask_cors import CORS
 from flask_pymongo import PyMongo
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timedelta
-import bcrypt
-import uuid
 import os
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.config import Config
+from app.utils.exchange_rates import rates
+from app.utils.rate_refresher import RateRefresher, source_from_config
+import authz
+from authz import UserCache, admin_required, claim, issue_token
+from catalog_cache import CatalogCache
+from password_pool import PasswordPool, PasswordPoolBusy
+from rate_limit import Limit, RateLimiter, backend_from_url
+from product_prices import parse_pins, price_fields, recompute_prices
+from response_cache import ResponseCache
+from storefront import (ProductNotFound, build_order, cart_claim, cart_currency, cart_line_ops, cart_product_fields,
+                        cart_quantity_ops, cart_removal, cart_reprice_ops, cart_restore, cart_subtotal_op, order_view,
+                        parse_cart_quantities, parse_json_body, parse_object_ids, parse_product_view, parse_quantity,
+                        placed_order, price_cart, product_projection, products_cache_key, products_payload, shape_product,
+                        unapplied_cart_lines)
+from pagination import KEYSET_SORT, encode_cursor, keyset_filter, keyset_page, parse_page_size
+from indexes import ensure_indexes
+from json_provider import OrjsonProvider
+from mongo_pool import PoolMonitor, pool_options, prefill
+import request_metrics
+from slow_queries import SlowQueryLog
+import daily_stats
+from sales_analytics import sales_report
+from exports import (CUSTOMER_COLUMNS, CUSTOMER_PROJECTION, EXPORT_BATCH_SIZE, EXPORT_FORMATS,
+                     ORDER_COLUMNS, customer_rows, export_response, order_rows)
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 # Configuration
 app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/queenkoba')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'queenkoba-super-secret-jwt-key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+app.config['MONGO_MAX_POOL_SIZE'] = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+app.config['MONGO_MIN_POOL_SIZE'] = int(os.getenv('MONGO_MIN_POOL_SIZE', '10'))
+app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'] = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+app.config['CATALOG_CACHE_TTL'] = int(os.getenv('CATALOG_CACHE_TTL', '300'))
+app.config['CURRENCY_API_URL'] = os.getenv('CURRENCY_API_URL', Config.CURRENCY_API_URL)
+app.config['FX_RATES_FILE'] = os.getenv('FX_RATES_FILE', '')
+app.config['FX_REFRESH_SECONDS'] = int(os.getenv('FX_REFRESH_SECONDS', '3600'))
+app.config['FX_STALE_SECONDS'] = int(os.getenv('FX_STALE_SECONDS', '21600'))
+app.config['FX_MAX_CHANGE'] = float(os.getenv('FX_MAX_CHANGE', '0.5'))
+app.config['BCRYPT_ROUNDS'] = int(os.getenv('BCRYPT_ROUNDS', '12'))
+app.config['BCRYPT_WORKERS'] = int(os.getenv('BCRYPT_WORKERS', str(os.cpu_count() or 2)))
+app.config['BCRYPT_MAX_PENDING'] = int(os.getenv('BCRYPT_MAX_PENDING', '32'))
+app.config['BCRYPT_TIMEOUT'] = float(os.getenv('BCRYPT_TIMEOUT', '10'))
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', '30'))
+app.config['RATE_LIMITS_ENABLED'] = os.getenv('RATE_LIMITS_ENABLED', 'true').lower() == 'true'
+app.config['RATE_LIMIT_REDIS_URL'] = os.getenv('RATE_LIMIT_REDIS_URL', '')
+app.config['TRUSTED_PROXY_HOPS'] = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', '100'))
+app.config['SLOW_QUERY_LOG_FILE'] = os.getenv('SLOW_QUERY_LOG_FILE', '')
+app.config['SLOW_QUERY_EXPLAIN'] = os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+
+# Behind reverse proxies, the client address comes from X-Forwarded-For. Only
+# the last TRUSTED_PROXY_HOPS entries are believed, since a client can send its own
+if app.config['TRUSTED_PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'],
+                            x_proto=app.config['TRUSTED_PROXY_HOPS'])
+
+# Per-route budgets for the public endpoints that cost a bcrypt round or a write
+LOGIN_LIMITS = {'ip': Limit(20, 60), 'email': Limit(5, 60)}
+SIGNUP_LIMITS = {'ip': Limit(5, 600), 'email': Limit(3, 600)}
+REVIEW_LIMITS = {'ip': Limit(10, 600), 'customer_email': Limit(5, 600)}
+TICKET_LIMITS = {'ip': Limit(5, 600), 'customer_email': Limit(3, 600)}
 
 # Initialize extensions
-mongo = PyMongo(app)
+pool_monitor = PoolMonitor()
+slow_queries = SlowQueryLog(
+    threshold_ms=app.config['SLOW_QUERY_MS'],
+    path=app.config['SLOW_QUERY_LOG_FILE'] or None,
+    explain=app.config['SLOW_QUERY_EXPLAIN']
+)
+mongo = PyMongo(app, event_listeners=[pool_monitor, request_metrics.CommandMetrics(), slow_queries],
+                **pool_options(app.config))
+slow_queries.bind(mongo.cx, mongo.db)
+request_metrics.init_app(app)
 jwt = JWTManager(app)
+catalog_cache = CatalogCache(ttl=app.config['CATALOG_CACHE_TTL'])
+response_cache = ResponseCache(ttl=app.config['CATALOG_CACHE_TTL'])
+passwords = PasswordPool(
+    rounds=app.config['BCRYPT_ROUNDS'],
+    workers=app.config['BCRYPT_WORKERS'],
+    max_pending=app.config['BCRYPT_MAX_PENDING'],
+    timeout=app.config['BCRYPT_TIMEOUT']
+)
+user_cache = UserCache(ttl=app.config['USER_CACHE_TTL'])
+# Admin writes re-check the stored role and status, at most USER_CACHE_TTL seconds stale
+authz.init_app(app, lambda user_id: user_cache.get(mongo.db.users, user_id))
+limiter = RateLimiter(
+    backend_from_url(app.config['RATE_LIMIT_REDIS_URL']),
+    enabled=app.config['RATE_LIMITS_ENABLED']
+)
+rate_refresher = RateRefresher(
+    source_from_config(app.config),
+    db=mongo.db,
+    interval=app.config['FX_REFRESH_SECONDS'],
+    stale_after=app.config['FX_STALE_SECONDS'],
+    max_change=app.config['FX_MAX_CHANGE']
+)
+rate_refresher.init_app(app)
 
 # ========== HELPER FUNCTIONS ==========
-def serialize_doc(doc):
-    """Convert MongoDB document to JSON serializable format"""
-    if not doc:
-        return None
-    if '_id' in doc:
-        doc['_id'] = str(doc['_id'])
-    return doc
-
-def calculate_prices(base_price_usd):
-    """Calculate prices in all currencies"""
-    exchange_rates = {
-        'KES': 128.5,      # Kenyan Shilling
-        'UGX': 3582.34,    # Ugandan Shilling
-        'BIF': 2850.0,     # Burundi Franc
-        'CDF': 2700.0      # Congolese Franc
-    }
+# Default user projections: never ship the password hash, cart or legacy order arrays
+USER_PUBLIC_PROJECTION = {'password_hash': 0, 'cart': 0, 'orders': 0}
+
+# What a login needs to check the password and issue the token
+USER_AUTH_FIELDS = {
+    'password_hash': 1, 'username': 1, 'name': 1, 'email': 1, 'phone': 1, 'country': 1,
+    'preferred_currency': 1, 'role': 1, 'permissions': 1, 'status': 1
+}
+
+def fetch_products_by_id(product_ids, projection=None):
+    """Load many products with a single $in query, keyed by string id"""
+    object_ids = parse_object_ids(product_ids)
+    if not object_ids:
+        return {}
+
+    products = mongo.db.products.find({'_id': {'$in': object_ids}}, projection)
+    return {str(p['_id']): p for p in products}
+
+def password_busy(key='error'):
+    """503 for when the password pool is saturated"""
+    response = jsonify({key: 'Server busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def check_password(user, password):
+    """Verify a login on the password pool, upgrading the hash if its cost is outdated"""
+    if not passwords.verify(password, user.get('password_hash')):
+        return False
     
-    currency_symbols = {
-        'KES': 'KSh',
-        'UGX': 'USh',
-        'BIF': 'FBu',
-        'CDF': 'FC'
+    if passwords.needs_rehash(user['password_hash']):
+        user_id, old_hash = user['_id'], user['password_hash']
+        # Conditional, so a password change made meanwhile is never overwritten
+        passwords.rehash_later(password, lambda new_hash: mongo.db.users.update_one(
+            {'_id': user_id, 'password_hash': old_hash},
+            {'$set': {'password_hash': new_hash}}
+        ))
+    return True
+
+def admin_page(collection, query=None, projection=None):
+    """Fetch one keyset page using the request's `after` and `page_size` args"""
+    page_size = parse_page_size(request.args.get('page_size'))
+    return keyset_page(collection, query or {}, request.args.get('after'), page_size, projection)
+
+def parse_date_range(default_days=30):
+    """Read inclusive ?from=&to= (YYYY-MM-DD) args, defaulting to the last `default_days` days"""
+    try:
+        date_to = (datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to')
+                   else datetime.utcnow())
+        date_from = (datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from')
+                     else date_to - timedelta(days=default_days))
+    except ValueError:
+        raise ValueError('from and to must be YYYY-MM-DD')
+    return date_from, date_to
+
+def created_at_filter():
+    """created_at condition covering the whole days in the request's from/to range"""
+    date_from, date_to = parse_date_range(default_days=365)
+    return {
+        '$gte': date_from.replace(hour=0, minute=0, second=0, microsecond=0),
+        '$lt': date_to.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
     }
+
+def supports_transactions():
+    """Multi-document transactions need a replica set or sharded cluster"""
+    topology = mongo.cx.topology_description.topology_type_name
+    return topology in ('ReplicaSetWithPrimary', 'Sharded')
+
+def commit_order(user_id, cart, order):
+    """Insert an order and clear the cart it was built from as one unit.
     
-    prices = {}
-    for currency, rate in exchange_rates.items():
-        prices[currency] = {
-            'amount': round(base_price_usd * rate, 2),
-            'symbol': currency_symbols[currency],
-            'country': {
-                'KES': 'Kenya',
-                'UGX': 'Uganda',
-                'BIF': 'Burundi',
-                'CDF': 'DRC Congo'
-            }[currency]
-        }
+    The cart is only cleared if it still matches what the order was priced
+    from, so a concurrent cart change makes this return False instead of
+    losing items. Uses a transaction when the deployment supports one and
+    otherwise claims the cart with a conditional update before inserting the
+    order, restoring the cart if the insert fails.
+    
+    Either way the daily_stats rollup is updated once the order is in, and a
+    failure there is logged rather than raised.
+    """
+    cart_filter, cart_update = cart_claim(user_id, cart, order)
+    
+    if supports_transactions():
+        def write_order(session):
+            result = mongo.db.users.update_one(cart_filter, cart_update, session=session)
+            if result.matched_count == 0:
+                return False
+            mongo.db.orders.insert_one(order, session=session)
+            return True
+        
+        with mongo.cx.start_session() as session:
+            if not session.with_transaction(write_order):
+                return False
+    else:
+        result = mongo.db.users.update_one(cart_filter, cart_update)
+        if result.matched_count == 0:
+            return False
+        
+        try:
+            mongo.db.orders.insert_one(order)
+        except Exception:
+            mongo.db.users.update_one(*cart_restore(user_id, cart))
+            raise
+    
+    # The rollup can be rebuilt from orders, so never fail a placed order over it
+    try:
+        daily_stats.record_order(mongo.db, order)
+    except Exception:
+        app.logger.exception('Failed to update daily_stats for order %s', order['order_id'])
+    return True
+
+def warm_up():
+    """Ready a freshly started process: Mongo pool, exchange rates and catalog cache.
+    
+    Call once per process before it takes traffic; under a pre-forking server
+    that means after fork (see gunicorn.conf.py).
+    """
+    connections = prefill(mongo.cx, pool_monitor, app.config['MONGO_MIN_POOL_SIZE'])
+    print(f"✅ Opened {connections} MongoDB connections")
+    
+    # Last known good rates until the first refresh lands; publishing reprices the catalog
+    if rate_refresher.load_last_good():
+        print(f"✅ Loaded exchange rates fetched {rates.snapshot.fetched_at.isoformat()}")
+    else:
+        reprice_catalog(rates.snapshot)
     
-    return prices
+    catalog_cache.load(mongo.db.products)
+    print(f"✅ Cached {catalog_cache.stats()['products']} products")
+
+@rate_refresher.on_publish
+def reprice_catalog(snapshot):
+    """Bring stored product prices up to newly published rates"""
+    updated = recompute_prices(mongo.db, snapshot)
+    # Other workers may have repriced already, so always drop our cached copy
+    catalog_cache.invalidate()
+    return updated
 
 # ========== SEED DATA ==========
 def seed_products():
@@ -128,23 +317,22 @@ def seed_products():
             
             # Add calculated prices to each product
             for product in products_to_seed:
-                product['prices'] = calculate_prices(product['base_price_usd'])
+                product.update(price_fields(product['base_price_usd']))
             
             # Insert products
             mongo.db.products.insert_many(products_to_seed)
             print(f"✅ Seeded {len(products_to_seed)} products")
             
         # Create admin user if not exists
-        if mongo.db.users.count_documents({'email': 'admin@queenkoba.com'}) == 0:
+        if mongo.db.users.count_documents({'email': 'info@queenkoba.com'}) == 0:
             admin_user = {
                 'username': 'admin',
                 'email': 'info@queenkoba.com',
-                'password_hash': bcrypt.hashpw(b'admin123', bcrypt.gensalt()).decode('utf-8'),
+                'password_hash': passwords.hash('admin123'),
                 'country': 'Kenya',
                 'preferred_currency': 'KES',
                 'role': 'admin',
                 'cart': [],
-                'orders': [],
                 'created_at': datetime.utcnow(),
                 'updated_at': datetime.utcnow()
             }
@@ -169,6 +357,7 @@ def home():
             'POST /auth/register': 'Register user',
             'POST /auth/login': 'Login user',
             'POST /cart/add': 'Add to cart',
+            'PUT /cart/quantities': 'Set many cart quantities',
             'GET /cart': 'View cart',
             'POST /checkout': 'Checkout',
             'GET /orders': 'User orders',
@@ -201,40 +390,56 @@ def health_check():
             'products': products_count,
             'users': users_count,
             'orders': orders_count
-        }
+        },
+        'catalog_cache': catalog_cache.stats(),
+        'exchange_rates': rate_refresher.metrics(),
+        'password_pool': passwords.stats(),
+        'rate_limits': limiter.stats(),
+        'user_cache': user_cache.stats(),
+        'mongo_pool': pool_monitor.stats(),
+        'slow_queries': slow_queries.stats()
     })
 
 # ========== PRODUCT ROUTES ==========
 @app.route('/products', methods=['GET'])
 def get_products():
     try:
-        products = list(mongo.db.products.find())
-        serialized_products = [serialize_doc(p) for p in products]
+        fields, currency = parse_product_view()
+        snapshot = catalog_cache.snapshot(mongo.db.products)
         
-        return jsonify({
-            'status': 'success',
-            'count': len(serialized_products),
-            'products': serialized_products
-        })
+        return response_cache.respond(
+            products_cache_key(fields, currency),
+            lambda: products_payload(snapshot, fields, currency),
+            version=snapshot.version
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/products/<product_id>', methods=['GET'])
 def get_product(product_id):
+    if not ObjectId.is_valid(product_id):
+        return jsonify({'error': 'Invalid product ID'}), 400
+    
     try:
-        product = mongo.db.products.find_one({'_id': ObjectId(product_id)})
+        fields, currency = parse_product_view()
+        product = catalog_cache.get(mongo.db.products, product_id)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
         return jsonify({
             'status': 'success',
-            'product': serialize_doc(product)
+            'product': shape_product(product, fields, currency)
         })
-    except:
-        return jsonify({'error': 'Invalid product ID'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 # ========== AUTH ROUTES ==========
 @app.route('/auth/signup', methods=['POST'])
+@limiter.limit('signup', error_key='message', **SIGNUP_LIMITS)
 def signup():
     try:
         data = request.get_json()
@@ -244,7 +449,7 @@ def signup():
             return jsonify({'message': 'Name, email, phone and password required'}), 400
         
         # Check if user exists
-        if mongo.db.users.find_one({'email': data['email']}):
+        if mongo.db.users.find_one({'email': data['email']}, {'_id': 1}):
             return jsonify({'message': 'Email already registered'}), 400
         
         # Create user
@@ -252,7 +457,7 @@ def signup():
             'name': data['name'],
             'email': data['email'],
             'phone': data['phone'],
-            'password_hash': bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+            'password_hash': passwords.hash(data['password']),
             'role': 'customer',
             'created_at': datetime.utcnow()
         }
@@ -261,7 +466,7 @@ def signup():
         user_id = str(result.inserted_id)
         
         # Create JWT token
-        token = create_access_token(identity=user_id)
+        token = issue_token(user)
         
         return jsonify({
             'token': token,
@@ -272,10 +477,15 @@ def signup():
                 'phone': user['phone']
             }
         }), 201
+    except DuplicateKeyError:
+        return jsonify({'message': 'Email already registered'}), 400
+    except PasswordPoolBusy:
+        return password_busy('message')
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 @app.route('/auth/login', methods=['POST'])
+@limiter.limit('login', error_key='message', **LOGIN_LIMITS)
 def customer_login():
     try:
         data = request.get_json()
@@ -284,16 +494,16 @@ def customer_login():
             return jsonify({'message': 'Email and password required'}), 400
         
         # Find user
-        user = mongo.db.users.find_one({'email': data['email'], 'role': 'customer'})
+        user = mongo.db.users.find_one({'email': data['email'], 'role': 'customer'}, USER_AUTH_FIELDS)
         if not user:
             return jsonify({'message': 'Invalid credentials'}), 401
         
         # Check password
-        if not bcrypt.checkpw(data['password'].encode('utf-8'), user['password_hash'].encode('utf-8')):
+        if not check_password(user, data['password']):
             return jsonify({'message': 'Invalid credentials'}), 401
         
         # Create token
-        token = create_access_token(identity=str(user['_id']))
+        token = issue_token(user)
         
         return jsonify({
             'token': token,
@@ -304,6 +514,8 @@ def customer_login():
                 'phone': user.get('phone', '')
             }
         })
+    except PasswordPoolBusy:
+        return password_busy('message')
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
@@ -313,6 +525,7 @@ def google_login():
     return jsonify({'message': 'Google OAuth not configured yet'}), 501
 
 @app.route('/auth/register', methods=['POST'])
+@limiter.limit('register', **SIGNUP_LIMITS)
 def register():
     try:
         data = request.get_json()
@@ -324,24 +537,23 @@ def register():
                 return jsonify({'error': f'{field} is required'}), 400
         
         # Check if user exists
-        if mongo.db.users.find_one({'email': data['email']}):
+        if mongo.db.users.find_one({'email': data['email']}, {'_id': 1}):
             return jsonify({'error': 'Email already registered'}), 400
         
-        if mongo.db.users.find_one({'username': data['username']}):
+        if mongo.db.users.find_one({'username': data['username']}, {'_id': 1}):
             return jsonify({'error': 'Username already taken'}), 400
         
         # Create user
         user = {
             'username': data['username'],
             'email': data['email'],
-            'password_hash': bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+            'password_hash': passwords.hash(data['password']),
             'country': data.get('country', 'Kenya'),
             'preferred_currency': data.get('preferred_currency', 'KES'),
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow(),
             'role': 'customer',
-            'cart': [],
-            'orders': []
+            'cart': []
         }
         
         # Insert user
@@ -349,7 +561,7 @@ def register():
         user_id = str(result.inserted_id)
         
         # Create JWT token
-        access_token = create_access_token(identity=user_id)
+        access_token = issue_token(user)
         
         # Prepare response
         user_response = {
@@ -368,10 +580,16 @@ def register():
             'user': user_response
         }), 201
         
+    except DuplicateKeyError as e:
+        message = 'Username already taken' if 'username' in str(e) else 'Email already registered'
+        return jsonify({'error': message}), 400
+    except PasswordPoolBusy:
+        return password_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/auth/login', methods=['POST'])
+@limiter.limit('login', **LOGIN_LIMITS)
 def login():
     try:
         data = request.get_json()
@@ -380,16 +598,16 @@ def login():
             return jsonify({'error': 'Email and password required'}), 400
         
         # Find user
-        user = mongo.db.users.find_one({'email': data['email']})
+        user = mongo.db.users.find_one({'email': data['email']}, USER_AUTH_FIELDS)
         if not user:
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Check password
-        if not bcrypt.checkpw(data['password'].encode('utf-8'), user['password_hash'].encode('utf-8')):
+        if not check_password(user, data['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Create token
-        access_token = create_access_token(identity=str(user['_id']))
+        access_token = issue_token(user)
         
         # Prepare response
         user_response = {
@@ -408,6 +626,8 @@ def login():
             'user': user_response
         })
         
+    except PasswordPoolBusy:
+        return password_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -416,7 +636,7 @@ def login():
 def get_profile():
     try:
         user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+        user = user_cache.get(mongo.db.users, user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -445,42 +665,28 @@ def get_profile():
 def get_cart():
     try:
         user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+        user = mongo.db.users.find_one(
+            {'_id': ObjectId(user_id)},
+            {'cart': 1, 'cart_subtotal_usd': 1}
+        )
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         cart_items = user.get('cart', [])
+        currency = cart_currency(claim('preferred_currency', 'KES'))
         
-        # Calculate totals
-        total_usd = 0
-        for item in cart_items:
-            product = mongo.db.products.find_one({'_id': ObjectId(item['product_id'])})
-            if product:
-                item['product_name'] = product['name']
-                item['product_price'] = product['base_price_usd']
-                total_usd += product['base_price_usd'] * item['quantity']
-        
-        # Calculate in user's preferred currency
-        preferred_currency = user.get('preferred_currency', 'KES')
-        exchange_rates = {'KES': 128.5, 'UGX': 3582.34, 'BIF': 2850.0, 'CDF': 2700.0}
-        rate = exchange_rates.get(preferred_currency, 1)
-        total_local = total_usd * rate
+        # Hydrate every cart line with one query, at the prices checkout will charge
+        products = fetch_products_by_id(
+            [item['product_id'] for item in cart_items],
+            cart_product_fields(currency)
+        )
+        total = price_cart(cart_items, products, currency, user.get('cart_subtotal_usd'))
         
         return jsonify({
             'status': 'success',
             'cart': cart_items,
-            'total': {
-                'usd': round(total_usd, 2),
-                'local': round(total_local, 2),
-                'currency': preferred_currency,
-                'symbol': {
-                    'KES': 'KSh',
-                    'UGX': 'USh',
-                    'BIF': 'FBu',
-                    'CDF': 'FC'
-                }.get(preferred_currency, '$')
-            }
+            'total': total
         })
         
     except Exception as e:
@@ -491,51 +697,78 @@ def get_cart():
 def add_to_cart():
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
+        data = parse_json_body(request.get_json(silent=True))
         
         # Validation
         if not data.get('product_id') or not data.get('quantity'):
             return jsonify({'error': 'Product ID and quantity required'}), 400
+        quantity = parse_quantity(data['quantity'])
         
         # Check if product exists
-        product = mongo.db.products.find_one({'_id': ObjectId(data['product_id'])})
+        product = catalog_cache.get(mongo.db.products, data['product_id'])
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
-        # Get user
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        if not user:
+        # Increment the line if present, otherwise push it, and recompute the
+        # subtotal, in one round trip
+        operations = cart_line_ops(user_id, product, quantity, increment=True) + [cart_subtotal_op(user_id)]
+        result = mongo.db.users.bulk_write(operations)
+        if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
+        if result.matched_count == 1:
+            # Only the subtotal matched: another request pushed the same line between our two statements
+            result = mongo.db.users.bulk_write(operations)
+            if result.matched_count < 2:
+                return jsonify({'error': 'Cart changed during update, please try again'}), 409
         
-        # Check if product already in cart
-        cart = user.get('cart', [])
-        product_in_cart = False
-        
-        for item in cart:
-            if item['product_id'] == data['product_id']:
-                item['quantity'] += data['quantity']
-                product_in_cart = True
-                break
+        return jsonify({
+            'status': 'success',
+            'message': 'Product added to cart'
+        })
         
-        if not product_in_cart:
-            cart.append({
-                'product_id': data['product_id'],
-                'quantity': data['quantity'],
-                'added_at': datetime.utcnow()
-            })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cart/quantities', methods=['PUT'])
+@jwt_required()
+def set_cart_quantities():
+    try:
+        user_id = get_jwt_identity()
+        data = parse_json_body(request.get_json(silent=True))
         
-        # Update user's cart
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {'cart': cart, 'updated_at': datetime.utcnow()}}
+        # Quantity 0 removes a line; anything else sets it, adding the line if needed
+        lines = parse_cart_quantities(
+            data.get('items'),
+            lambda product_id: catalog_cache.get(mongo.db.products, product_id)
         )
         
+        # Every line change and the subtotal go to Mongo as a single write
+        result = mongo.db.users.bulk_write(cart_quantity_ops(user_id, lines) + [cart_subtotal_op(user_id)])
+        if result.matched_count != len(lines) + 1:
+            # Another request changed the cart mid-batch: check each line against
+            # the stored cart and redo the ones that did not land
+            user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'cart.product_id': 1, 'cart.quantity': 1})
+            if not user:
+                return jsonify({'error': 'User not found'}), 404
+            pending = unapplied_cart_lines(user.get('cart', []), lines)
+            if pending:
+                result = mongo.db.users.bulk_write(cart_quantity_ops(user_id, pending) + [cart_subtotal_op(user_id)])
+                if result.matched_count != len(pending) + 1:
+                    return jsonify({'error': 'Cart changed during update, please try again'}), 409
+        
         return jsonify({
             'status': 'success',
-            'message': 'Product added to cart',
-            'cart_count': len(cart)
+            'message': 'Cart updated',
+            # Distinct products set or removed; a repeated product counts once
+            'lines_changed': len(lines)
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ProductNotFound as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -545,25 +778,19 @@ def remove_from_cart(product_id):
     try:
         user_id = get_jwt_identity()
         
-        # Get user
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+        # Drop the line, recompute the subtotal and read back what is left in one round trip
+        user = mongo.db.users.find_one_and_update(
+            *cart_removal(user_id, product_id),
+            projection={'cart.product_id': 1},
+            return_document=ReturnDocument.AFTER
+        )
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Remove product from cart
-        cart = user.get('cart', [])
-        new_cart = [item for item in cart if item['product_id'] != product_id]
-        
-        # Update user's cart
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {'cart': new_cart, 'updated_at': datetime.utcnow()}}
-        )
-        
         return jsonify({
             'status': 'success',
             'message': 'Product removed from cart',
-            'cart_count': len(new_cart)
+            'cart_count': len(user.get('cart', []))
         })
         
     except Exception as e:
@@ -575,10 +802,10 @@ def remove_from_cart(product_id):
 def checkout():
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
+        data = parse_json_body(request.get_json(silent=True))
         
         # Get user
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+        user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'cart': 1})
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -586,65 +813,23 @@ def checkout():
         if len(cart) == 0:
             return jsonify({'error': 'Cart is empty'}), 400
         
-        # Calculate total
-        total_usd = 0
-        order_items = []
-        
-        for item in cart:
-            product = mongo.db.products.find_one({'_id': ObjectId(item['product_id'])})
-            if product:
-                item_total = product['base_price_usd'] * item['quantity']
-                total_usd += item_total
-                
-                order_items.append({
-                    'product_id': str(product['_id']),
-                    'product_name': product['name'],
-                    'quantity': item['quantity'],
-                    'price_per_item': product['base_price_usd'],
-                    'item_total': item_total
-                })
-        
-        # Create order
-        order = {
-            'order_id': str(uuid.uuid4())[:8].upper(),
-            'user_id': user_id,
-            'items': order_items,
-            'total_usd': total_usd,
-            'shipping_address': data.get('shipping_address', {}),
-            'payment_method': data.get('payment_method', 'card'),
-            'payment_status': 'pending',
-            'order_status': 'processing',
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
+        currency = cart_currency(claim('preferred_currency', 'KES'))
         
-        # Save order
-        order_result = mongo.db.orders.insert_one(order)
-        order_id = str(order_result.inserted_id)
-        
-        # Clear user's cart
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {'cart': [], 'updated_at': datetime.utcnow()}}
+        # Load every product in the cart with one query
+        products = fetch_products_by_id(
+            [item['product_id'] for item in cart],
+            cart_product_fields(currency)
         )
+        order = build_order(user_id, cart, products, currency, data)
         
-        # Add order to user's orders
-        user_orders = user.get('orders', [])
-        user_orders.append(order_id)
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {'orders': user_orders}}
-        )
+        # Save order, clear the cart and link the order to the user together
+        if not commit_order(user_id, cart, order):
+            return jsonify({'error': 'Cart changed during checkout, please try again'}), 409
         
-        return jsonify({
-            'status': 'success',
-            'message': 'Order created successfully',
-            'order_id': order['order_id'],
-            'order_number': order_id,
-            'total': total_usd,
-            'items_count': len(order_items)
-        })
+        return jsonify(placed_order(order))
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -657,18 +842,10 @@ def get_orders():
         # Get user's orders
         orders = list(mongo.db.orders.find({'user_id': user_id}).sort('created_at', -1))
         
-        serialized_orders = []
-        for order in orders:
-            order_dict = serialize_doc(order)
-            # Convert datetime to string
-            if 'created_at' in order_dict and isinstance(order_dict['created_at'], datetime):
-                order_dict['created_at'] = order_dict['created_at'].isoformat()
-            serialized_orders.append(order_dict)
-        
         return jsonify({
             'status': 'success',
-            'count': len(serialized_orders),
-            'orders': serialized_orders
+            'count': len(orders),
+            'orders': orders
         })
         
     except Exception as e:
@@ -689,26 +866,9 @@ def get_order(order_id):
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
-        order_dict = serialize_doc(order)
-        
-        # Calculate local currency total
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
-        preferred_currency = user.get('preferred_currency', 'KES')
-        exchange_rates = {'KES': 128.5, 'UGX': 3582.34, 'BIF': 2850.0, 'CDF': 2700.0}
-        rate = exchange_rates.get(preferred_currency, 1)
-        
-        order_dict['total_local'] = order_dict['total_usd'] * rate
-        order_dict['currency'] = preferred_currency
-        order_dict['currency_symbol'] = {
-            'KES': 'KSh',
-            'UGX': 'USh',
-            'BIF': 'FBu',
-            'CDF': 'FC'
-        }.get(preferred_currency, '$')
-        
         return jsonify({
             'status': 'success',
-            'order': order_dict
+            'order': order_view(order, claim('preferred_currency', 'KES'))
         })
         
     except Exception as e:
@@ -716,6 +876,7 @@ def get_order(order_id):
 
 # ========== ADMIN ROUTES ==========
 @app.route('/admin/auth/login', methods=['POST'])
+@limiter.limit('admin_login', **LOGIN_LIMITS)
 def admin_login():
     try:
         data = request.get_json()
@@ -724,7 +885,7 @@ def admin_login():
             return jsonify({'error': 'Email and password required'}), 400
         
         # Find admin user
-        user = mongo.db.users.find_one({'email': data['email']})
+        user = mongo.db.users.find_one({'email': data['email']}, USER_AUTH_FIELDS)
         if not user or user.get('role') not in ['admin', 'super_admin']:
             return jsonify({'error': 'Invalid credentials'}), 401
         
@@ -733,11 +894,11 @@ def admin_login():
             return jsonify({'error': 'Account suspended'}), 403
         
         # Check password
-        if not bcrypt.checkpw(data['password'].encode('utf-8'), user['password_hash'].encode('utf-8')):
+        if not check_password(user, data['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Create token
-        access_token = create_access_token(identity=str(user['_id']))
+        access_token = issue_token(user)
         
         return jsonify({
             'token': access_token,
@@ -749,93 +910,147 @@ def admin_login():
                 'permissions': user.get('permissions', ['*'])
             }
         })
+    except PasswordPoolBusy:
+        return password_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/dashboard/kpis', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_dashboard_kpis():
     try:
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        date_from, date_to = parse_date_range()
+        
+        totals = daily_stats.summarize(mongo.db, date_from, date_to)
         
         # Total Revenue
-        revenue_pipeline = [
-            {'$match': {'created_at': {'$gte': thirty_days_ago}, 'payment_status': 'paid'}},
-            {'$group': {'_id': None, 'total': {'$sum': '$total_usd'}}}
-        ]
-        revenue_result = list(mongo.db.orders.aggregate(revenue_pipeline))
-        total_revenue = revenue_result[0]['total'] if revenue_result else 0
+        total_revenue = totals['payments'].get('paid', {}).get('usd', 0)
         
         # Total Orders
-        total_orders = mongo.db.orders.count_documents({'created_at': {'$gte': thirty_days_ago}})
+        total_orders = totals['orders']
         
         # Total Customers
         total_customers = mongo.db.users.count_documents({'role': 'customer'})
         
-        # Conversion Rate
-        conversion_rate = 3.2
+        # Paid Order Rate: share of placed orders that were paid
+        paid_orders = totals['payments'].get('paid', {}).get('count', 0)
+        paid_order_rate = round(paid_orders / total_orders * 100, 2) if total_orders else 0
+        
+        # Refund Rate
+        refunded_orders = totals['statuses'].get('refunded', 0)
+        refund_rate = round(refunded_orders / total_orders * 100, 2) if total_orders else 0
         
         # Low Stock Items
-        low_stock = mongo.db.products.count_documents({'in_stock': False})
+        low_stock = sum(1 for p in catalog_cache.all(mongo.db.products) if not p.get('in_stock', True))
         
         # Expiring Soon
         expiring_soon = 0
         
         return jsonify({
+            'from': daily_stats.day_key(date_from),
+            'to': daily_stats.day_key(date_to),
             'total_revenue': total_revenue,
             'total_orders': total_orders,
             'total_customers': total_customers,
-            'conversion_rate': conversion_rate,
-            'refund_rate': 0.5,
+            'paid_order_rate': paid_order_rate,
+            'refund_rate': refund_rate,
             'low_stock_items': low_stock,
             'expiring_soon': expiring_soon
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/analytics/sales', methods=['GET'])
+@admin_required
+def get_sales_analytics():
+    try:
+        date_from, date_to = parse_date_range()
+        
+        report = sales_report(mongo.db, date_from, date_to, request.args.get('bucket', 'day'))
+        
+        return jsonify({
+            'from': daily_stats.day_key(date_from),
+            'to': daily_stats.day_key(date_to),
+            **report
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/slow-queries', methods=['GET'])
+@admin_required
+def admin_get_slow_queries():
+    # Slow finds and aggregates from the last ?hours= (default 24), one row per query shape
+    try:
+        hours = float(request.args.get('hours', 24))
+        shapes = slow_queries.by_shape(hours)
+        
+        return jsonify({
+            'status': 'success',
+            'threshold_ms': slow_queries.threshold_ms,
+            'count': len(shapes),
+            'shapes': shapes
+        })
+    except ValueError:
+        return jsonify({'error': 'hours must be a number'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/products', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_products():
     try:
-        products = list(mongo.db.products.find())
+        fields, currency = parse_product_view()
+        products = list(mongo.db.products.find({}, product_projection(fields, currency)))
         return jsonify({
-            'products': [serialize_doc(p) for p in products],
+            'products': [shape_product(p, fields, currency) for p in products],
             'total': len(products)
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/products', methods=['POST'])
-@jwt_required()
+@admin_required
 def admin_create_product():
     try:
         data = request.get_json()
         
+        # Any prices sent with the product are pinned overrides
+        pins = parse_pins(data.get('prices') or {})
+        
         new_product = {
             'name': data.get('name'),
             'description': data.get('description', ''),
             'category': data.get('category', 'Other'),
             'base_price_usd': data.get('base_price_usd', 0),
-            'prices': data.get('prices', {}),
             'in_stock': data.get('in_stock', True),
             'image_url': data.get('image_url', '/images/product.jpg'),
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
+        new_product.update(price_fields(new_product['base_price_usd'], pins))
         
         result = mongo.db.products.insert_one(new_product)
         new_product['_id'] = str(result.inserted_id)
+        catalog_cache.put(new_product)
         
         return jsonify({
             'status': 'success',
             'message': 'Product created successfully',
-            'product': serialize_doc(new_product)
+            'product': new_product
         }), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/products/<product_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_update_product(product_id):
     try:
         data = request.get_json()
@@ -852,12 +1067,26 @@ def admin_update_product(product_id):
             update_data['category'] = data['category']
         if 'in_stock' in data:
             update_data['in_stock'] = data['in_stock']
-        if 'prices' in data:
-            update_data['prices'] = data['prices']
+        if 'prices' in data or 'unpin_prices' in data:
+            current = mongo.db.products.find_one(
+                {'_id': ObjectId(product_id)},
+                {'base_price_usd': 1, 'pinned_prices': 1}
+            )
+            if not current:
+                return jsonify({'error': 'Product not found'}), 404
+            
+            # Prices sent by an admin are pinned and survive rate recomputes
+            pins = dict(current.get('pinned_prices') or {})
+            pins.update(parse_pins(data.get('prices') or {}))
+            for currency in data.get('unpin_prices') or []:
+                pins.pop(str(currency).upper(), None)
+            
+            base_price_usd = current.get('base_price_usd', 0)
             # Also update base_price_usd if KES price is provided
-            if isinstance(data['prices'], dict) and 'KES' in data['prices']:
-                kes_amount = data['prices']['KES'].get('amount', 0)
-                update_data['base_price_usd'] = round(kes_amount / 128.5, 2)
+            if isinstance(data.get('prices'), dict) and 'KES' in data['prices']:
+                base_price_usd = rates.convert(pins['KES'], 'KES', 'USD')
+                update_data['base_price_usd'] = base_price_usd
+            update_data.update(price_fields(base_price_usd, pins))
         
         result = mongo.db.products.update_one(
             {'_id': ObjectId(product_id)},
@@ -868,17 +1097,23 @@ def admin_update_product(product_id):
             return jsonify({'error': 'Product not found'}), 404
         
         updated_product = mongo.db.products.find_one({'_id': ObjectId(product_id)})
+        catalog_cache.put(updated_product)
+        if 'base_price_usd' in update_data:
+            # Carts holding the product move to the new price with their subtotals
+            mongo.db.users.bulk_write(cart_reprice_ops(product_id, base_price_usd))
         
         return jsonify({
             'status': 'success',
             'message': 'Product updated successfully',
-            'product': serialize_doc(updated_product)
+            'product': updated_product
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/products/<product_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def admin_delete_product(product_id):
     try:
         result = mongo.db.products.delete_one({'_id': ObjectId(product_id)})
@@ -886,6 +1121,10 @@ def admin_delete_product(product_id):
         if result.deleted_count == 0:
             return jsonify({'error': 'Product not found'}), 404
         
+        catalog_cache.remove(product_id)
+        # Checkout skips lines of deleted products, so they stop counting towards subtotals
+        mongo.db.users.bulk_write(cart_reprice_ops(product_id, 0))
+        
         return jsonify({
             'status': 'success',
             'message': 'Product deleted successfully'
@@ -894,46 +1133,56 @@ def admin_delete_product(product_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/orders', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_orders():
     try:
-        orders = list(mongo.db.orders.find().sort('created_at', -1).limit(50))
+        orders, next_cursor = admin_page(mongo.db.orders)
         return jsonify({
-            'orders': [serialize_doc(o) for o in orders],
-            'total': len(orders)
+            'orders': orders,
+            'total': len(orders),
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/orders/<order_id>/status', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_update_order_status(order_id):
     try:
         data = request.get_json()
         status = data.get('status')
         note = data.get('note', '')
         
-        mongo.db.orders.update_one(
+        # The pre-update document tells the rollup which bucket to move from
+        previous = mongo.db.orders.find_one_and_update(
             {'_id': ObjectId(order_id)},
             {'$set': {
                 'order_status': status,
                 'updated_at': datetime.utcnow(),
                 'status_note': note
-            }}
+            }},
+            projection={'order_status': 1, 'created_at': 1}
         )
+        if previous:
+            daily_stats.record_status_change(mongo.db, previous, status)
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/customers', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_customers():
     try:
-        customers = list(mongo.db.users.find({'role': 'customer'}).limit(50))
+        customers, next_cursor = admin_page(mongo.db.users, {'role': 'customer'}, USER_PUBLIC_PROJECTION)
         return jsonify({
-            'customers': [serialize_doc(c) for c in customers],
-            'total': len(customers)
+            'customers': customers,
+            'total': len(customers),
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -941,26 +1190,25 @@ def admin_get_customers():
 @app.route('/promotions/active', methods=['GET'])
 def get_active_promotions():
     try:
-        promotions = list(mongo.db.promotions.find({'status': 'active'}))
-        return jsonify({
-            'promotions': [serialize_doc(p) for p in promotions]
-        })
+        return response_cache.respond('/promotions/active', lambda: {
+            'promotions': list(mongo.db.promotions.find({'status': 'active'}))
+        }, namespace='promotions')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/promotions', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_promotions():
     try:
         promotions = list(mongo.db.promotions.find())
         return jsonify({
-            'promotions': [serialize_doc(p) for p in promotions]
+            'promotions': promotions
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/promotions', methods=['POST'])
-@jwt_required()
+@admin_required
 def admin_create_promotion():
     try:
         data = request.get_json()
@@ -976,24 +1224,26 @@ def admin_create_promotion():
         }
         result = mongo.db.promotions.insert_one(promo)
         promo['_id'] = str(result.inserted_id)
+        response_cache.bump('promotions')
         return jsonify({
             'status': 'success',
-            'promotion': serialize_doc(promo)
+            'promotion': promo
         }), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/promotions/<promo_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def admin_delete_promotion(promo_id):
     try:
         mongo.db.promotions.delete_one({'_id': ObjectId(promo_id)})
+        response_cache.bump('promotions')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/promotions/<promo_id>/status', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_update_promotion_status(promo_id):
     try:
         data = request.get_json()
@@ -1001,24 +1251,29 @@ def admin_update_promotion_status(promo_id):
             {'_id': ObjectId(promo_id)},
             {'$set': {'status': data.get('status')}}
         )
+        response_cache.bump('promotions')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ========== REVIEWS ==========
 @app.route('/admin/reviews', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_reviews():
     try:
-        reviews = list(mongo.db.reviews.find().sort('created_at', -1))
+        reviews, next_cursor = admin_page(mongo.db.reviews)
         return jsonify({
-            'reviews': [serialize_doc(r) for r in reviews]
+            'reviews': reviews,
+            'total': len(reviews),
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/reviews/<review_id>/approve', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_approve_review(review_id):
     try:
         mongo.db.reviews.update_one(
@@ -1030,7 +1285,7 @@ def admin_approve_review(review_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/reviews/<review_id>/reject', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_reject_review(review_id):
     try:
         mongo.db.reviews.update_one(
@@ -1042,7 +1297,7 @@ def admin_reject_review(review_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/reviews/<review_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def admin_delete_review(review_id):
     try:
         mongo.db.reviews.delete_one({'_id': ObjectId(review_id)})
@@ -1055,12 +1310,13 @@ def get_approved_reviews():
     try:
         reviews = list(mongo.db.reviews.find({'status': 'approved'}).sort('created_at', -1).limit(50))
         return jsonify({
-            'reviews': [serialize_doc(r) for r in reviews]
+            'reviews': reviews
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/products/<product_id>/reviews', methods=['POST'])
+@limiter.limit('review', **REVIEW_LIMITS)
 def create_review(product_id):
     try:
         data = request.get_json()
@@ -1084,47 +1340,124 @@ def create_review(product_id):
         return jsonify({'error': str(e)}), 500
 
 # ========== PAYMENTS ==========
+# Only the fields the payments view shows, computed server side
+PAYMENT_PROJECTION = {
+    '_id': 1,
+    'created_at': 1,
+    'order_id': 1,
+    'customer_email': {'$ifNull': ['$customer_email', 'N/A']},
+    'customer_name': {'$ifNull': ['$shipping_address.name', 'N/A']},
+    'amount': {'$ifNull': ['$total_usd', 0]},
+    'payment_method': {'$ifNull': ['$payment_method', 'card']},
+    'payment_status': {'$ifNull': ['$payment_status', 'pending']}
+}
+
 @app.route('/admin/payments', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_payments():
+    # Filters: status, method and an inclusive from/to date range. Pages like
+    # the other admin lists; all=1 streams every matching payment instead.
     try:
-        # Get payments from orders
-        orders = list(mongo.db.orders.find().sort('created_at', -1))
-        payments = []
-        
-        for order in orders:
-            payment = {
-                '_id': str(order['_id']),
-                'order_id': order.get('order_id'),
-                'customer_email': order.get('customer_email', 'N/A'),
-                'customer_name': order.get('shipping_address', {}).get('name', 'N/A'),
-                'amount': order.get('total_usd', 0),
-                'payment_method': order.get('payment_method', 'card'),
-                'payment_status': order.get('payment_status', 'pending'),
-                'created_at': order.get('created_at')
-            }
-            payments.append(payment)
-        
-        return jsonify({
-            'payments': payments
-        })
+        query = {}
+        if request.args.get('status'):
+            query['payment_status'] = request.args['status']
+        if request.args.get('method'):
+            query['payment_method'] = request.args['method']
+        if request.args.get('from') or request.args.get('to'):
+            query['created_at'] = created_at_filter()
+        
+        page_size = None if request.args.get('all') else parse_page_size(request.args.get('page_size'))
+        pipeline = [
+            {'$match': keyset_filter(query, request.args.get('after'))},
+            {'$sort': dict(KEYSET_SORT)}
+        ]
+        if page_size is not None:
+            # One extra row tells us whether another page exists
+            pipeline.append({'$limit': page_size + 1})
+        pipeline.append({'$project': PAYMENT_PROJECTION})
+        
+        rows = mongo.db.orders.aggregate(pipeline)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        next_cursor = None
+        last = None
+        total = 0
+        yield '{"payments":['
+        for index, row in enumerate(rows):
+            if index == page_size:
+                next_cursor = encode_cursor(last)
+                break
+            last = row
+            total += 1
+            yield (',' if index else '') + current_app.json.dumps(row)
+        yield '],"total":' + str(total) + ',"next_cursor":' + current_app.json.dumps(next_cursor) + '}\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+# ========== EXPORTS ==========
+def export_request(status_field):
+    """Read the export format and filters shared by the export routes"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    query = {}
+    if request.args.get('status'):
+        query[status_field] = request.args['status']
+    if request.args.get('from') or request.args.get('to'):
+        query['created_at'] = created_at_filter()
+    return export_format, query
+
+@app.route('/admin/export/orders', methods=['GET'])
+@admin_required
+def admin_export_orders():
+    try:
+        export_format, query = export_request('order_status')
+        if request.args.get('payment_status'):
+            query['payment_status'] = request.args['payment_status']
+        
+        orders = mongo.db.orders.find(query).sort(KEYSET_SORT).batch_size(EXPORT_BATCH_SIZE)
+        rows = (row for order in orders for row in order_rows(order))
+        return export_response('orders', export_format, rows, ORDER_COLUMNS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/export/customers', methods=['GET'])
+@admin_required
+def admin_export_customers():
+    try:
+        export_format, query = export_request('status')
+        query['role'] = 'customer'
+        
+        customers = (mongo.db.users.find(query, CUSTOMER_PROJECTION)
+                     .sort(KEYSET_SORT).batch_size(EXPORT_BATCH_SIZE))
+        rows = (row for customer in customers for row in customer_rows(customer))
+        return export_response('customers', export_format, rows, CUSTOMER_COLUMNS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ========== SHIPPING ZONES ==========
 @app.route('/admin/shipping-zones', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_shipping_zones():
     try:
         zones = list(mongo.db.shipping_zones.find())
         return jsonify({
-            'zones': [serialize_doc(z) for z in zones]
+            'zones': zones
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/shipping-zones', methods=['POST'])
-@jwt_required()
+@admin_required
 def admin_create_shipping_zone():
     try:
         data = request.get_json()
@@ -1138,15 +1471,16 @@ def admin_create_shipping_zone():
         }
         result = mongo.db.shipping_zones.insert_one(zone)
         zone['_id'] = str(result.inserted_id)
+        response_cache.bump('shipping_zones')
         return jsonify({
             'status': 'success',
-            'zone': serialize_doc(zone)
+            'zone': zone
         }), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/shipping-zones/<zone_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_update_shipping_zone(zone_id):
     try:
         data = request.get_json()
@@ -1158,12 +1492,13 @@ def admin_update_shipping_zone(zone_id):
                 'delivery_days': data.get('delivery_days')
             }}
         )
+        response_cache.bump('shipping_zones')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/shipping-zones/<zone_id>/status', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_toggle_shipping_zone(zone_id):
     try:
         data = request.get_json()
@@ -1171,15 +1506,17 @@ def admin_toggle_shipping_zone(zone_id):
             {'_id': ObjectId(zone_id)},
             {'$set': {'active': data.get('active')}}
         )
+        response_cache.bump('shipping_zones')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/shipping-zones/<zone_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def admin_delete_shipping_zone(zone_id):
     try:
         mongo.db.shipping_zones.delete_one({'_id': ObjectId(zone_id)})
+        response_cache.bump('shipping_zones')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1187,16 +1524,15 @@ def admin_delete_shipping_zone(zone_id):
 @app.route('/shipping-zones/active', methods=['GET'])
 def get_active_shipping_zones():
     try:
-        zones = list(mongo.db.shipping_zones.find({'active': True}))
-        return jsonify({
-            'zones': [serialize_doc(z) for z in zones]
-        })
+        return response_cache.respond('/shipping-zones/active', lambda: {
+            'zones': list(mongo.db.shipping_zones.find({'active': True}))
+        }, namespace='shipping_zones')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ========== CONTENT MANAGEMENT ==========
 @app.route('/admin/content', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_content():
     try:
         content = mongo.db.site_content.find_one({'_id': 'main'})
@@ -1215,12 +1551,13 @@ def admin_get_content():
                 'footer_text': '© 2024 Queen Koba. All rights reserved.',
             }
             mongo.db.site_content.insert_one(content)
-        return jsonify({'content': serialize_doc(content)})
+            response_cache.bump('content')
+        return jsonify({'content': content})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/content', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_update_content():
     try:
         data = request.get_json()
@@ -1232,6 +1569,7 @@ def admin_update_content():
             {'$set': {section: value}},
             upsert=True
         )
+        response_cache.bump('content')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1239,37 +1577,40 @@ def admin_update_content():
 @app.route('/content', methods=['GET'])
 def get_public_content():
     try:
-        content = mongo.db.site_content.find_one({'_id': 'main'})
-        return jsonify({'content': serialize_doc(content) if content else {}})
+        def build():
+            content = mongo.db.site_content.find_one({'_id': 'main'})
+            return {'content': content or {}}
+        
+        return response_cache.respond('/content', build, namespace='content')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ========== ADMIN MANAGEMENT ==========
 @app.route('/admin/admins', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_all_admins():
     try:
-        admins = list(mongo.db.users.find({'role': {'$in': ['admin', 'super_admin']}}))
+        admins = list(mongo.db.users.find({'role': {'$in': ['admin', 'super_admin']}}, USER_PUBLIC_PROJECTION))
         return jsonify({
-            'admins': [serialize_doc(a) for a in admins]
+            'admins': admins
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/admins', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_admin():
     try:
         data = request.get_json()
         
         # Check if email exists
-        if mongo.db.users.find_one({'email': data['email']}):
+        if mongo.db.users.find_one({'email': data['email']}, {'_id': 1}):
             return jsonify({'error': 'Email already exists'}), 400
         
         admin = {
             'username': data.get('full_name'),
             'email': data['email'],
-            'password_hash': bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+            'password_hash': passwords.hash(data['password']),
             'role': data.get('role', 'admin'),
             'permissions': data.get('permissions', ['read', 'write']),
             'status': 'active',
@@ -1279,13 +1620,15 @@ def create_admin():
         admin['_id'] = str(result.inserted_id)
         return jsonify({
             'status': 'success',
-            'admin': serialize_doc(admin)
+            'admin': admin
         }), 201
+    except PasswordPoolBusy:
+        return password_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/admins/<admin_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_admin(admin_id):
     try:
         data = request.get_json()
@@ -1300,18 +1643,21 @@ def update_admin(admin_id):
         if 'permissions' in data:
             update_data['permissions'] = data['permissions']
         if 'password' in data and data['password']:
-            update_data['password_hash'] = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            update_data['password_hash'] = passwords.hash(data['password'])
         
         mongo.db.users.update_one(
             {'_id': ObjectId(admin_id)},
             {'$set': update_data}
         )
+        user_cache.invalidate(admin_id)
         return jsonify({'status': 'success'})
+    except PasswordPoolBusy:
+        return password_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/admins/<admin_id>/status', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_admin_status(admin_id):
     try:
         data = request.get_json()
@@ -1319,42 +1665,48 @@ def update_admin_status(admin_id):
             {'_id': ObjectId(admin_id)},
             {'$set': {'status': data.get('status')}}
         )
+        user_cache.invalidate(admin_id)
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/admins/<admin_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_admin(admin_id):
     try:
         mongo.db.users.delete_one({'_id': ObjectId(admin_id)})
+        user_cache.invalidate(admin_id)
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ========== SUPPORT TICKETS ==========
 @app.route('/admin/support-tickets', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_support_tickets():
     try:
-        tickets = list(mongo.db.support_tickets.find().sort('created_at', -1))
+        tickets, next_cursor = admin_page(mongo.db.support_tickets)
         return jsonify({
-            'tickets': [serialize_doc(t) for t in tickets]
+            'tickets': tickets,
+            'total': len(tickets),
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/support-tickets/<ticket_id>', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_support_ticket(ticket_id):
     try:
         ticket = mongo.db.support_tickets.find_one({'_id': ObjectId(ticket_id)})
-        return jsonify({'ticket': serialize_doc(ticket)})
+        return jsonify({'ticket': ticket})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/support-tickets/<ticket_id>/status', methods=['PUT'])
-@jwt_required()
+@admin_required
 def admin_update_ticket_status(ticket_id):
     try:
         data = request.get_json()
@@ -1367,7 +1719,7 @@ def admin_update_ticket_status(ticket_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/support-tickets/<ticket_id>/reply', methods=['POST'])
-@jwt_required()
+@admin_required
 def admin_reply_to_ticket(ticket_id):
     try:
         data = request.get_json()
@@ -1385,6 +1737,7 @@ def admin_reply_to_ticket(ticket_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/support-tickets', methods=['POST'])
+@limiter.limit('support_ticket', **TICKET_LIMITS)
 def create_support_ticket():
     try:
         data = request.get_json()
@@ -1406,39 +1759,67 @@ def create_support_ticket():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ========== EXCHANGE RATES ==========
+@app.route('/admin/exchange-rates', methods=['GET'])
+@admin_required
+def admin_get_exchange_rates():
+    return jsonify({
+        'status': 'success',
+        'base': 'USD',
+        'rates': rates.snapshot.as_dict(),
+        'refresher': rate_refresher.metrics()
+    })
+
+@app.route('/admin/exchange-rates/refresh', methods=['POST'])
+@admin_required
+def admin_refresh_exchange_rates():
+    # Always goes to the provider, bypassing rates another worker persisted
+    if not rate_refresher.refresh(force=True):
+        return jsonify({'error': rate_refresher.last_error, 'refresher': rate_refresher.metrics()}), 502
+    return jsonify({
+        'status': 'success',
+        'rates': rates.snapshot.as_dict(),
+        'refresher': rate_refresher.metrics()
+    })
+
 # ========== PAYMENT METHODS ==========
+PAYMENT_METHODS = {
+    'Kenya': [
+        {'name': 'M-Pesa', 'code': 'mpesa', 'description': 'Mobile money'},
+        {'name': 'Airtel Money', 'code': 'airtel', 'description': 'Mobile money'},
+        {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'},
+        {'name': 'Bank Transfer', 'code': 'bank', 'description': 'Direct transfer'}
+    ],
+    'Uganda': [
+        {'name': 'MTN Mobile Money', 'code': 'mtn', 'description': 'Mobile money'},
+        {'name': 'Airtel Money', 'code': 'airtel', 'description': 'Mobile money'},
+        {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'}
+    ],
+    'Burundi': [
+        {'name': 'Lumicash', 'code': 'lumicash', 'description': 'Mobile money'},
+        {'name': 'EcoCash', 'code': 'ecocash', 'description': 'Mobile money'},
+        {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'}
+    ],
+    'DRC Congo': [
+        {'name': 'Orange Money', 'code': 'orange', 'description': 'Mobile money'},
+        {'name': 'Vodacom M-Pesa', 'code': 'mpesa', 'description': 'Mobile money'},
+        {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'}
+    ],
+}
+
 @app.route('/payment-methods/<country>', methods=['GET'])
 def get_payment_methods(country):
-    payment_methods = {
-        'Kenya': [
-            {'name': 'M-Pesa', 'code': 'mpesa', 'description': 'Mobile money'},
-            {'name': 'Airtel Money', 'code': 'airtel', 'description': 'Mobile money'},
-            {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'},
-            {'name': 'Bank Transfer', 'code': 'bank', 'description': 'Direct transfer'}
-        ],
-        'Uganda': [
-            {'name': 'MTN Mobile Money', 'code': 'mtn', 'description': 'Mobile money'},
-            {'name': 'Airtel Money', 'code': 'airtel', 'description': 'Mobile money'},
-            {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'}
-        ],
-        'Burundi': [
-            {'name': 'Lumicash', 'code': 'lumicash', 'description': 'Mobile money'},
-            {'name': 'EcoCash', 'code': 'ecocash', 'description': 'Mobile money'},
-            {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'}
-        ],
-        'DRC Congo': [
-            {'name': 'Orange Money', 'code': 'orange', 'description': 'Mobile money'},
-            {'name': 'Vodacom M-Pesa', 'code': 'mpesa', 'description': 'Mobile money'},
-            {'name': 'Visa/Mastercard', 'code': 'card', 'description': 'Credit/Debit card'}
-        ],
-    }
+    def build():
+        return {
+            'status': 'success',
+            'country': country,
+            'methods': PAYMENT_METHODS.get(country, [])
+        }
     
-    methods = payment_methods.get(country, [])
-    return jsonify({
-        'status': 'success',
-        'country': country,
-        'methods': methods
-    })
+    # Only known countries are cached so arbitrary paths cannot grow the cache
+    if country not in PAYMENT_METHODS:
+        return jsonify(build())
+    return response_cache.respond(f'/payment-methods/{country}', build, version=0)
 
 # ========== MAIN ==========
 if __name__ == '__main__':
@@ -1454,10 +1835,22 @@ if __name__ == '__main__':
         # Seed products
         seed_products()
         
+        # Reconcile the index registry
+        for collection, result in ensure_indexes(mongo.db).items():
+            for index in result['created']:
+                print(f"✅ Created index {collection}.{index}")
+            for index, error in result['failed'].items():
+                print(f"⚠️ Index {collection}.{index} failed: {error}")
+        
+        # Open the pool, load rates and warm the catalog cache before taking traffic
+        warm_up()
+        
     except Exception as e:
         print(f"⚠️ MongoDB connection failed: {e}")
         print("⚠️ Using in-memory storage (data will reset on restart)")
     
+    rate_refresher.start()
+    
     print("\n📦 Features:")
     print("   • User registration & authentication")
     print("   • Shopping cart with add/remove functionality")
@@ -1489,4 +1882,5 @@ if __name__ == '__main__':
     print("   Starting API... (Press Ctrl+C to stop)")
     print("="*70 + "\n")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; production runs gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,205 @@
+"""Token-bucket rate limiting for the expensive public endpoints.
+
+Each route gets budgets keyed by client IP and, where the body carries one, by
+email address. A bucket holds up to `capacity` tokens and refills at
+`capacity / period` tokens per second; each request takes one token, and a
+request that finds the bucket empty is answered 429 with a Retry-After header
+before the route touches bcrypt or Mongo.
+
+Buckets live in a pluggable backend. MemoryBackend keeps them per process;
+RedisBackend shares them across workers and hosts. Whichever is used, a key
+that has just been refused is remembered locally until its retry time, so a
+client hammering a closed bucket is turned away without a backend round trip.
+
+IP budgets key on request.remote_addr. Behind a reverse proxy that is the
+proxy's own address, which would put every client in one bucket, so set
+TRUSTED_PROXY_HOPS to the number of proxies in front of the app (1 for a
+single nginx or load balancer). The app then wraps itself in werkzeug's
+ProxyFix and takes the client address from that many X-Forwarded-For entries.
+Never set it higher than the real hop count: the extra entries come from the
+client and could be forged to dodge the limits.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+
+# Refused keys remembered locally before expired ones are swept
+MAX_BLOCKED_KEYS = 10000
+
+TOO_MANY_REQUESTS = 'Too many requests, please try again later'
+
+
+class Limit:
+    """`capacity` requests per `period` seconds, refilled continuously"""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def __repr__(self):
+        return f'Limit({self.capacity}/{self.period}s)'
+
+
+class MemoryBackend:
+    """Buckets in a bounded in-process LRU"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, limit, now=None):
+        """Take one token, returning 0 when allowed or the seconds until one is available"""
+        now = now or time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / limit.rate
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisBackend:
+    """Buckets shared through Redis, updated atomically by a Lua script"""
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.prefix = prefix
+        self._take = client.register_script(self.SCRIPT)
+
+    def take(self, key, limit, now=None):
+        # Wall-clock time, since buckets are shared between machines
+        return float(self._take(keys=[self.prefix + key], args=[limit.capacity, limit.rate, time.time()]))
+
+
+def backend_from_url(url=None):
+    """RedisBackend for a redis:// URL, otherwise a per-process MemoryBackend"""
+    if not url:
+        return MemoryBackend()
+    import redis  # only needed when limits are shared between workers
+    return RedisBackend(redis.Redis.from_url(url))
+
+
+def client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def retry_after(wait):
+    """Retry-After header value for a refusal that lasts `wait` seconds"""
+    return str(max(1, math.ceil(wait)))
+
+
+class RateLimiter:
+    """Applies per-route budgets from a backend to Flask views"""
+
+    def __init__(self, backend=None, enabled=True):
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+        self._blocked = {}
+        self.allowed = 0
+        self.rejected = 0
+
+    def _wait(self, key, limit):
+        now = time.monotonic()
+        until = self._blocked.get(key)
+        if until is not None:
+            if until > now:
+                return until - now
+            self._blocked.pop(key, None)
+
+        wait = self.backend.take(key, limit)
+        if wait > 0:
+            if len(self._blocked) >= MAX_BLOCKED_KEYS:
+                self._blocked = {k: t for k, t in self._blocked.items() if t > now}
+            self._blocked[key] = now + wait
+        return wait
+
+    def check(self, name, rules, ip=None, body=None):
+        """Seconds the current request must wait under `rules`, or 0 if it may proceed.
+
+        `rules` maps a scope to a Limit: 'ip' keys on the client address, any
+        other scope names a JSON body field (such as 'email') to key on.
+        `ip` and `body` default to those of the current Flask request.
+        """
+        for scope, limit in rules.items():
+            if scope == 'ip':
+                value = ip or client_ip()
+            else:
+                if body is None:
+                    body = request.get_json(silent=True)
+                    body = body if isinstance(body, dict) else {}
+                value = body.get(scope)
+                if not isinstance(value, str) or not value.strip():
+                    continue
+                value = value.strip().lower()
+
+            wait = self._wait(f'{name}:{scope}:{value}', limit)
+            if wait > 0:
+                return wait
+        return 0
+
+    def count(self, wait):
+        """Record the outcome of a check"""
+        if wait > 0:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+
+    def limit(self, name, error_key='error', **rules):
+        """Decorator enforcing `rules` (scope=Limit) on a view.
+
+        The view keeps its budgets in `rate_limits`, so other front ends
+        serving the same route can enforce the same ones.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled:
+                    wait = self.check(name, rules)
+                    self.count(wait)
+                    if wait > 0:
+                        response = jsonify({error_key: TOO_MANY_REQUESTS})
+                        response.headers['Retry-After'] = retry_after(wait)
+                        return response, 429
+                return view(*args, **kwargs)
+            wrapper.rate_limits = (name, error_key, rules)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'blocked_keys': len(self._blocked)
+        }
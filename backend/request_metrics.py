@@ -0,0 +1,167 @@
+"""Per-route request and Mongo metrics, exposed in Prometheus text format.
+
+init_app() hooks a Flask app so every request records, under its URL rule
+(`/orders/<order_id>`, not the concrete path), and instrument() does the same
+for one async endpoint of the ASGI app:
+
+    queenkoba_http_request_duration_seconds   latency histogram
+    queenkoba_http_requests_total             count by status code
+    queenkoba_http_requests_in_flight         requests being handled now
+
+CommandMetrics is a pymongo CommandListener. The driver reports each command
+on the thread that issued it, so it can be charged to the route that thread
+is serving, giving command counts and durations per route and a histogram of
+Mongo commands per request. An N+1 shows up there as a route whose requests
+issue many commands. Commands issued outside a request (warm-up, the rate
+refresher) are charged to the route 'background'.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR to a directory
+that is emptied at startup and every worker's samples are aggregated when
+/metrics is scraped (gunicorn.conf.py takes care of dead workers).
+"""
+import os
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from pymongo.monitoring import CommandListener
+
+MONGO_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+COMMANDS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 25, 50, 100)
+
+REQUEST_LATENCY = Histogram(
+    'queenkoba_http_request_duration_seconds', 'Request latency by route',
+    ['route', 'method']
+)
+REQUESTS = Counter(
+    'queenkoba_http_requests', 'Requests by route and status code',
+    ['route', 'method', 'status']
+)
+IN_FLIGHT = Gauge(
+    'queenkoba_http_requests_in_flight', 'Requests currently being handled',
+    ['route'], multiprocess_mode='livesum'
+)
+MONGO_COMMANDS = Counter(
+    'queenkoba_mongo_commands', 'Mongo commands by issuing route',
+    ['route', 'command', 'outcome']
+)
+MONGO_LATENCY = Histogram(
+    'queenkoba_mongo_command_duration_seconds', 'Mongo command latency by issuing route',
+    ['route', 'command'], buckets=MONGO_BUCKETS
+)
+MONGO_PER_REQUEST = Histogram(
+    'queenkoba_mongo_commands_per_request', 'Mongo commands issued while handling one request',
+    ['route'], buckets=COMMANDS_PER_REQUEST_BUCKETS
+)
+
+
+class RequestScope:
+    """The route a thread is serving and the Mongo commands it has issued so far"""
+
+    def __init__(self, route):
+        self.route = route
+        self.commands = 0
+
+
+_scope = ContextVar('request_scope', default=None)
+
+
+def current_route():
+    scope = _scope.get()
+    return scope.route if scope else 'background'
+
+
+class CommandMetrics(CommandListener):
+    """Charges every Mongo command to the route being served on the issuing thread"""
+
+    def started(self, event):
+        scope = _scope.get()
+        if scope is not None:
+            scope.commands += 1
+
+    def succeeded(self, event):
+        self._record(event, 'ok')
+
+    def failed(self, event):
+        self._record(event, 'failed')
+
+    @staticmethod
+    def _record(event, outcome):
+        route = current_route()
+        MONGO_COMMANDS.labels(route, event.command_name, outcome).inc()
+        MONGO_LATENCY.labels(route, event.command_name).observe(event.duration_micros / 1e6)
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _start(route):
+    IN_FLIGHT.labels(route).inc()
+    return _scope.set(RequestScope(route))
+
+
+def _finish(token, method, started, status):
+    scope = _scope.get()
+    _scope.reset(token)
+
+    route = scope.route
+    IN_FLIGHT.labels(route).dec()
+    REQUEST_LATENCY.labels(route, method).observe(time.perf_counter() - started)
+    REQUESTS.labels(route, method, str(status)).inc()
+    MONGO_PER_REQUEST.labels(route).observe(scope.commands)
+
+
+def _before():
+    g.metrics_started = time.perf_counter()
+    g.metrics_token = _start(_route())
+
+
+def _after(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown(exc):
+    token = g.pop('metrics_token', None)
+    if token is None:
+        return
+    _finish(token, request.method, g.metrics_started, g.get('metrics_status', 500))
+
+
+def instrument(endpoint, route):
+    """Record an async endpoint's requests under `route`, as init_app does for Flask views"""
+    @wraps(endpoint)
+    async def wrapper(request):
+        started = time.perf_counter()
+        token = _start(route)
+        status = 500
+        try:
+            response = await endpoint(request)
+            status = response.status_code
+            return response
+        finally:
+            _finish(token, request.method, started, status)
+    return wrapper
+
+
+def render():
+    """Every metric in Prometheus text format, aggregated across workers when configured"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def init_app(app, path='/metrics'):
+    """Record every request of `app` and serve the metrics at `path`"""
+    app.before_request(_before)
+    app.after_request(_after)
+    app.teardown_request(_teardown)
+    app.add_url_rule(path, 'metrics', lambda: Response(render(), content_type=CONTENT_TYPE_LATEST))
@@ -0,0 +1,75 @@
+"""Serialized response cache with strong ETags for public read endpoints.
+
+Each entry keeps the JSON body already encoded, together with an ETag hashed
+from those bytes, for one version of its content. A repeat request is answered
+straight from the entry (or with 304 Not Modified when the client sends a
+matching If-None-Match) without touching Mongo or re-running jsonify.
+
+Versions are bumped in-process by the admin routes that change the content.
+Entries also expire after `ttl` seconds so writes handled by other worker
+processes are picked up. The ETag is a content hash rather than the version
+number, so two workers can never hand out the same tag for different bodies.
+"""
+import hashlib
+import threading
+import time
+
+from flask import Response, current_app, request
+
+
+class CachedResponse:
+    """Encoded body and ETag for one version of a resource"""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.stored_at = time.monotonic()
+
+
+class ResponseCache:
+    """Per-key cache of encoded JSON responses"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._versions = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace):
+        """Mark everything cached under `namespace` as stale"""
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def _make_response(self, entry):
+        if request.if_none_match.contains(entry.etag):
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype=current_app.json.mimetype)
+        response.set_etag(entry.etag)
+        response.cache_control.no_cache = True
+        return response
+
+    def entry(self, key, build, encode, namespace=None, version=None):
+        """Cached entry for `key`, encoding `build()` with `encode` on a miss.
+
+        The entry is valid for `version` if given, otherwise for the current
+        version of `namespace`.
+        """
+        if version is None:
+            version = self.version(namespace)
+
+        entry = self._entries.get(key)
+        if (entry is None or entry.version != version
+                or time.monotonic() - entry.stored_at >= self.ttl):
+            entry = CachedResponse(version, encode(build()).encode('utf-8') + b'\n')
+            self._entries[key] = entry
+        return entry
+
+    def respond(self, key, build, namespace=None, version=None):
+        """Serve `key` from cache, calling `build()` for a fresh payload on a miss"""
+        entry = self.entry(key, build, current_app.json.dumps, namespace, version)
+        return self._make_response(entry)
@@ -1,6 +1,19 @@
-from app import create_app
+import os
+
+from app import create_app, mongo, pool_monitor
+from mongo_pool import prefill
 
 app = create_app()
 
+
+def warm_up():
+    """Open the Mongo pool before a gunicorn worker takes traffic (see gunicorn.conf.py)"""
+    try:
+        prefill(mongo.cx, pool_monitor, app.config['MONGO_MIN_POOL_SIZE'])
+    except Exception as e:
+        app.logger.warning('Worker starting cold, MongoDB unavailable: %s', e)
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server only; production runs gunicorn -c gunicorn.conf.py run:app
+    app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='0.0.0.0', port=5000)
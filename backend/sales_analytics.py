@@ -0,0 +1,210 @@
+"""Sales time series for /admin/analytics/sales.
+
+A report range is split into periods at bucket (day, ISO week, month)
+boundaries, the first and last clipped to the range. Periods that ended
+before today can no longer gain orders, so their order counts, gross, units
+per product and payment-method mix are kept per period in a small
+in-process LRU. Whatever is not cached, including the periods still open,
+comes from one $facet aggregation over those created_at ranges of orders,
+which the created_at index serves.
+
+Paid revenue is left out of the cache, since an old order can still be
+paid. It is read from the daily_stats rollups for the range instead, the
+same numbers the dashboard KPIs show.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from daily_stats import day_key
+
+BUCKET_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%G-W%V',
+    'month': '%Y-%m'
+}
+
+# Closed periods kept, across all bucket sizes
+CLOSED_CACHE_SIZE = 1024
+
+_closed_periods = OrderedDict()
+_lock = threading.Lock()
+
+
+def _next_boundary(moment, bucket):
+    """Start of the bucket after the one `moment` falls in"""
+    if bucket == 'day':
+        return moment + timedelta(days=1)
+    if bucket == 'week':
+        # ISO weeks start on Monday
+        return moment + timedelta(days=7 - moment.weekday())
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+
+def _periods(start, end, bucket):
+    """(label, start, end) of each bucket overlapping [start, end), clipped to it"""
+    periods = []
+    while start < end:
+        period_end = min(_next_boundary(start, bucket), end)
+        periods.append((start.strftime(BUCKET_FORMATS[bucket]), start, period_end))
+        start = period_end
+    return periods
+
+
+def _ranges(periods):
+    """Merge adjacent periods into as few created_at ranges as possible"""
+    ranges = []
+    for _, start, end in periods:
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def _pipeline(periods, bucket):
+    label = {'$dateToString': {'format': BUCKET_FORMATS[bucket], 'date': '$created_at'}}
+    return [
+        {'$match': {'$or': [{'created_at': {'$gte': start, '$lt': end}} for start, end in _ranges(periods)]}},
+        {'$facet': {
+            'series': [
+                {'$group': {
+                    '_id': label,
+                    'orders': {'$sum': 1},
+                    'gross_usd': {'$sum': '$total_usd'}
+                }}
+            ],
+            'products': [
+                {'$unwind': '$items'},
+                {'$group': {
+                    '_id': {'period': label, 'product_id': '$items.product_id'},
+                    'product_name': {'$first': '$items.product_name'},
+                    'units': {'$sum': '$items.quantity'},
+                    'gross_usd': {'$sum': '$items.item_total'}
+                }}
+            ],
+            'payment_methods': [
+                {'$group': {
+                    '_id': {'period': label, 'payment_method': '$payment_method'},
+                    'orders': {'$sum': 1},
+                    'gross_usd': {'$sum': '$total_usd'}
+                }}
+            ]
+        }}
+    ]
+
+
+def _aggregate_periods(db, periods, bucket):
+    """Totals of each of `periods` from orders, keyed by label"""
+    totals = {label: {'orders': 0, 'gross_usd': 0, 'products': {}, 'payment_methods': {}}
+              for label, _, _ in periods}
+    result = next(db.orders.aggregate(_pipeline(periods, bucket)))
+
+    for row in result['series']:
+        totals[row['_id']].update(orders=row['orders'], gross_usd=row['gross_usd'])
+    for row in result['products']:
+        totals[row['_id']['period']]['products'][row['_id'].get('product_id')] = {
+            'product_name': row['product_name'],
+            'units': row['units'],
+            'gross_usd': row['gross_usd']
+        }
+    for row in result['payment_methods']:
+        totals[row['_id']['period']]['payment_methods'][row['_id'].get('payment_method')] = {
+            'orders': row['orders'],
+            'gross_usd': row['gross_usd']
+        }
+    return totals
+
+
+def _paid_revenue(db, start, end, bucket):
+    """Paid revenue per bucket label for [start, end), from the daily rollups"""
+    revenue = {}
+    days = db.daily_stats.find(
+        {'_id': {'$gte': day_key(start), '$lt': day_key(end)}},
+        {'payments.paid.usd': 1}
+    )
+    for day in days:
+        label = datetime.strptime(day['_id'], '%Y-%m-%d').strftime(BUCKET_FORMATS[bucket])
+        paid = day.get('payments', {}).get('paid', {}).get('usd', 0)
+        revenue[label] = revenue.get(label, 0) + paid
+    return revenue
+
+
+def _period_totals(db, periods, bucket):
+    """Totals of every period, from the cache where closed and from orders otherwise"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    totals = {}
+    with _lock:
+        for label, start, end in periods:
+            key = (bucket, start, end)
+            if end <= today and key in _closed_periods:
+                _closed_periods.move_to_end(key)
+                totals[label] = _closed_periods[key]
+
+    missing = [period for period in periods if period[0] not in totals]
+    if not missing:
+        return totals
+
+    fresh = _aggregate_periods(db, missing, bucket)
+    totals.update(fresh)
+    with _lock:
+        for label, start, end in missing:
+            if end <= today:
+                _closed_periods[(bucket, start, end)] = fresh[label]
+        while len(_closed_periods) > CLOSED_CACHE_SIZE:
+            _closed_periods.popitem(last=False)
+    return totals
+
+
+def sales_report(db, date_from, date_to, bucket='day'):
+    """Report for the inclusive date range [date_from, date_to]"""
+    if bucket not in BUCKET_FORMATS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKET_FORMATS)}")
+
+    start = datetime(date_from.year, date_from.month, date_from.day)
+    end = datetime(date_to.year, date_to.month, date_to.day) + timedelta(days=1)
+    if end <= start:
+        raise ValueError('to must not be before from')
+
+    periods = _periods(start, end, bucket)
+    totals = _period_totals(db, periods, bucket)
+    revenue = _paid_revenue(db, start, end, bucket)
+
+    series = []
+    products = {}
+    payment_methods = {}
+    for label, _, _ in periods:
+        period = totals[label]
+        if not period['orders']:
+            continue
+        series.append({
+            'bucket': label,
+            'orders': period['orders'],
+            'gross_usd': round(period['gross_usd'], 2),
+            'revenue_usd': round(revenue.get(label, 0), 2),
+            'average_order_value': round(period['gross_usd'] / period['orders'], 2)
+        })
+        for product_id, row in period['products'].items():
+            total = products.setdefault(product_id, {
+                'product_id': product_id, 'product_name': row['product_name'], 'units': 0, 'gross_usd': 0
+            })
+            total['units'] += row['units']
+            total['gross_usd'] += row['gross_usd']
+        for method, row in period['payment_methods'].items():
+            total = payment_methods.setdefault(method, {'payment_method': method, 'orders': 0, 'gross_usd': 0})
+            total['orders'] += row['orders']
+            total['gross_usd'] += row['gross_usd']
+
+    total_orders = sum(row['orders'] for row in payment_methods.values())
+    for row in products.values():
+        row['gross_usd'] = round(row['gross_usd'], 2)
+    for row in payment_methods.values():
+        row['gross_usd'] = round(row['gross_usd'], 2)
+        row['share'] = round(row['orders'] / total_orders * 100, 2) if total_orders else 0
+
+    return {
+        'bucket': bucket,
+        'series': series,
+        'products': sorted(products.values(), key=lambda row: -row['units']),
+        'payment_methods': sorted(payment_methods.values(), key=lambda row: -row['orders'])
+    }
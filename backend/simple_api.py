@@ -1,5 +1,6 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
+import os
 
 app = Flask(__name__)
 CORS(app)
@@ -46,4 +47,5 @@ if __name__ == '__main__':
     print("📦 Products loaded:", len(PRODUCTS))
     print("💳 Multi-currency prices: KES, UGX, BIF, CDF")
     print("\nPress Ctrl+C to stop")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; in production serve app with gunicorn
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,276 @@
+"""Slow-operation log built on pymongo command monitoring.
+
+SlowQueryLog is a CommandListener. Any find or aggregate that takes at least
+`threshold_ms` is recorded with its route (see request_metrics), its query
+shape and a summary of its explain() plan:
+
+    {'at': ..., 'route': '/auth/login', 'command': 'find', 'collection': 'users',
+     'shape': '{"filter": {"email": "?"}}', 'duration_ms': 182.4,
+     'plan': {'stages': ['COLLSCAN'], 'collscan': True, 'index': None,
+              'docs_examined': 48210, 'keys_examined': 0, 'returned': 1}}
+
+The shape keeps field names and operators and replaces every value with '?',
+so no customer data is stored and queries that differ only in their values
+group together. Entries go to the capped collection `slow_queries`, which
+indexes.ensure_indexes creates at startup, or to a JSONL file when `path` is
+set.
+
+The listener runs on the request thread, so it only queues what it saw.
+explain() and the write happen on a background thread, and each shape is
+explained at most once per `explain_interval` seconds. Later entries for the
+same shape reuse that plan.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo.monitoring import CommandListener
+
+from indexes import SLOW_QUERY_COLLECTION as COLLECTION
+from request_metrics import current_route
+
+logger = logging.getLogger(__name__)
+
+MONITORED_COMMANDS = ('find', 'aggregate')
+SKIPPED_DATABASES = ('admin', 'config', 'local')
+
+# Parts of a command that make up its shape, besides the filter or pipeline
+SHAPE_OPTIONS = ('sort', 'projection')
+
+
+def shape_of(value):
+    """`value` with field names and operators kept and every value replaced by '?'"""
+    if isinstance(value, dict):
+        return {key: shape_of(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $and/$or branches and pipeline stages keep their structure; value lists collapse
+        if value and all(isinstance(item, dict) for item in value):
+            return [shape_of(item) for item in value]
+        return ['?'] if value else []
+    return '?'
+
+
+def command_shape(command_name, command):
+    """Canonical JSON shape of a find or aggregate command"""
+    if command_name == 'aggregate':
+        shape = {'pipeline': [
+            # $sort and $project specs are structure, not data, so keep them verbatim
+            stage if next(iter(stage), None) in ('$sort', '$project', '$group') else shape_of(stage)
+            for stage in command.get('pipeline', [])
+        ]}
+    else:
+        shape = {'filter': shape_of(command.get('filter', {}))}
+        for option in SHAPE_OPTIONS:
+            if command.get(option):
+                shape[option] = dict(command[option])
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def _find_key(document, key):
+    """First value stored under `key` anywhere in a nested explain document"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _plan_stages(plan, stages, indexes):
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        stages.append(plan['stage'])
+    if plan.get('indexName'):
+        indexes.append(plan['indexName'])
+    for key in ('inputStage', 'queryPlan'):
+        _plan_stages(plan.get(key), stages, indexes)
+    for child in plan.get('inputStages', []):
+        _plan_stages(child, stages, indexes)
+
+
+def plan_summary(explain):
+    """COLLSCAN/IXSCAN stages and examined vs returned counts from an explain result"""
+    stages, indexes = [], []
+    _plan_stages(_find_key(explain, 'winningPlan'), stages, indexes)
+    stats = _find_key(explain, 'executionStats') or {}
+    return {
+        'stages': stages,
+        'collscan': 'COLLSCAN' in stages,
+        'index': indexes[0] if indexes else None,
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'returned': stats.get('nReturned')
+    }
+
+
+class SlowQueryLog(CommandListener):
+    """Records slow finds and aggregates, with their plans, from a bound client"""
+
+    def __init__(self, threshold_ms=100, path=None, explain=True, explain_interval=300, max_queued=1000):
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.client = None
+        self.database = None
+        self.recorded = 0
+        self.dropped = 0
+        self._started = {}
+        self._plans = {}
+        self._queue = queue.Queue(max_queued)
+        self._writer = None
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0 and self.client is not None
+
+    def bind(self, client, database):
+        """Client to explain with and database whose capped collection holds the log"""
+        self.client = client
+        self.database = database
+
+    # CommandListener, called on the thread that issued the command
+    def started(self, event):
+        if (not self.enabled or event.command_name not in MONITORED_COMMANDS
+                or event.database_name in SKIPPED_DATABASES
+                or event.command.get(event.command_name) == COLLECTION):
+            return
+        self._started[(event.connection_id, event.request_id)] = (
+            event.database_name, event.command_name, event.command, current_route()
+        )
+
+    def succeeded(self, event):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        try:
+            self._queue.put_nowait(started + (event.duration_micros / 1000, datetime.utcnow()))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self._ensure_writer()
+
+    def failed(self, event):
+        self._started.pop((event.connection_id, event.request_id), None)
+
+    # Background side
+    def _ensure_writer(self):
+        # Started on first use, so a pre-forking server never forks the thread
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                    self._writer.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.write(self._entry(*self._queue.get()))
+            except Exception as e:
+                logger.warning('Slow query log failed: %s', e)
+
+    def _entry(self, database, command_name, command, route, duration_ms, at):
+        collection = command.get(command_name)
+        shape = command_shape(command_name, command)
+        return {
+            'at': at,
+            'route': route,
+            'command': command_name,
+            'collection': collection,
+            'shape': shape,
+            'duration_ms': round(duration_ms, 2),
+            'plan': self._plan(database, command_name, command, (collection, shape))
+        }
+
+    def _plan(self, database, command_name, command, key):
+        if not self.explain:
+            return None
+        cached = self._plans.get(key)
+        if cached and time.monotonic() - cached[0] < self.explain_interval:
+            return cached[1]
+
+        if command_name == 'aggregate':
+            explained = {'aggregate': command['aggregate'], 'pipeline': command.get('pipeline', []), 'cursor': {}}
+        else:
+            explained = {k: v for k, v in command.items()
+                         if k in ('find', 'filter', 'sort', 'projection', 'limit', 'skip', 'hint', 'collation')}
+        try:
+            plan = plan_summary(self.client[database].command('explain', explained, verbosity='executionStats'))
+        except Exception as e:
+            plan = {'error': str(e)}
+        self._plans[key] = (time.monotonic(), plan)
+        return plan
+
+    def write(self, entry):
+        self.recorded += 1
+        if self.path:
+            with self._file_lock, open(self.path, 'a') as log:
+                log.write(json.dumps(entry, default=str) + '\n')
+            return
+        self.database[COLLECTION].insert_one(entry)
+
+    # Reading
+    def _entries(self, since):
+        if not self.path:
+            return self.database[COLLECTION].find({'at': {'$gte': since}}, {'_id': 0})
+        try:
+            with open(self.path) as log:
+                lines = log.readlines()
+        except FileNotFoundError:
+            return []
+        entries = (json.loads(line) for line in lines if line.strip())
+        return [e for e in entries if datetime.fromisoformat(e['at']) >= since]
+
+    def by_shape(self, hours=24):
+        """Entries from the last `hours` grouped by (collection, command, shape), worst total time first"""
+        groups = {}
+        for entry in self._entries(datetime.utcnow() - timedelta(hours=hours)):
+            key = (entry['collection'], entry['command'], entry['shape'])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'collection': entry['collection'],
+                    'command': entry['command'],
+                    'shape': json.loads(entry['shape']),
+                    'count': 0,
+                    'total_ms': 0,
+                    'max_ms': 0,
+                    'routes': set(),
+                    'last_seen': entry['at'],
+                    'plan': entry.get('plan')
+                }
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['routes'].add(entry['route'])
+            if str(entry['at']) >= str(group['last_seen']):
+                group['last_seen'] = entry['at']
+                group['plan'] = entry.get('plan') or group['plan']
+
+        shapes = sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
+        for group in shapes:
+            group['avg_ms'] = round(group['total_ms'] / group['count'], 2)
+            group['total_ms'] = round(group['total_ms'], 2)
+            group['routes'] = sorted(group['routes'])
+        return shapes
+
+    def stats(self):
+        return {
+            'threshold_ms': self.threshold_ms,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'pending': self._queue.qsize()
+        }
@@ -0,0 +1,411 @@
+"""Storefront logic shared by the Flask app and its ASGI variant.
+
+Product views, cart pricing, cart line updates and order building, with no
+I/O of their own: queenkoba_mongodb and queenkoba_async load the documents,
+call these and write the results, so both return the same JSON and charge
+the same prices.
+"""
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import request
+from pymongo import UpdateMany, UpdateOne
+
+from app.utils.exchange_rates import CURRENCY_SYMBOLS, rates
+from product_prices import PRICED_CURRENCIES
+
+SUPPORTED_CURRENCIES = PRICED_CURRENCIES
+
+# Fields a client may ask for with ?fields=; _id is always returned
+PRODUCT_FIELDS = (
+    'name', 'description', 'category', 'base_price_usd', 'prices',
+    'in_stock', 'image_url', 'created_at', 'updated_at'
+)
+
+# Only the fields a cart line needs when hydrating products
+CART_PRODUCT_FIELDS = {'name': 1, 'base_price_usd': 1}
+
+# Update pipeline recomputing the user's stored cart_subtotal_usd from the
+# unit_price_usd kept on each cart line
+CART_SUBTOTAL_STAGES = [
+    {'$set': {'cart_subtotal_usd': {'$map': {
+        'input': {'$ifNull': ['$cart', []]},
+        'as': 'line',
+        'in': {'$multiply': [{'$ifNull': ['$$line.unit_price_usd', 0]}, '$$line.quantity']}
+    }}}},
+    {'$set': {'cart_subtotal_usd': {'$sum': '$cart_subtotal_usd'}}}
+]
+
+
+class ProductNotFound(Exception):
+    pass
+
+
+# ========== PRODUCTS ==========
+def parse_product_view(args=None):
+    """Read ?fields= and ?currency= into (fields, currency), raising ValueError if invalid"""
+    args = request.args if args is None else args
+    fields = None
+    if args.get('fields'):
+        fields = tuple(sorted({f.strip() for f in args['fields'].split(',') if f.strip()}))
+        unknown = [f for f in fields if f not in PRODUCT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown product fields: {', '.join(unknown)}")
+
+    currency = args.get('currency')
+    if currency:
+        currency = currency.upper()
+        if currency not in SUPPORTED_CURRENCIES:
+            raise ValueError(f'Unsupported currency: {currency}')
+
+    return fields, currency or None
+
+
+def product_projection(fields, currency):
+    """Mongo projection matching shape_product for the same view"""
+    if fields is None:
+        if currency is None:
+            return None
+        return {f'prices.{c}': 0 for c in SUPPORTED_CURRENCIES if c != currency}
+
+    projection = {f: 1 for f in fields}
+    if currency and 'prices' in projection:
+        del projection['prices']
+        projection[f'prices.{currency}'] = 1
+    return projection
+
+
+def shape_product(product, fields, currency):
+    """Copy of a product with only the requested fields and currency"""
+    if fields is None:
+        shaped = dict(product)
+    else:
+        shaped = {'_id': product['_id']}
+        shaped.update((f, product[f]) for f in fields if f in product)
+
+    prices = shaped.get('prices')
+    if currency and isinstance(prices, dict):
+        shaped['prices'] = {currency: prices[currency]} if currency in prices else {}
+    elif currency and isinstance(prices, list):
+        shaped['prices'] = [p for p in prices if p.get('currency') == currency]
+    return shaped
+
+
+def products_cache_key(fields, currency):
+    """Response cache key of a /products view"""
+    return f"/products?fields={','.join(fields or ())}&currency={currency or ''}"
+
+
+def products_payload(snapshot, fields, currency):
+    """GET /products body for a catalog snapshot"""
+    products = list(snapshot.products)
+    if fields is not None or currency is not None:
+        products = [shape_product(p, fields, currency) for p in products]
+    return {
+        'status': 'success',
+        'count': len(products),
+        'products': products
+    }
+
+
+def local_price(product, currency):
+    """Stored price of a product in `currency`, or None when it has none"""
+    if currency == 'USD':
+        return product.get('base_price_usd')
+    price = (product.get('prices') or {}).get(currency)
+    return price.get('amount') if isinstance(price, dict) else None
+
+
+# ========== CART ==========
+def parse_object_ids(values):
+    """Distinct valid ObjectIds among `values`, skipping anything malformed"""
+    object_ids = []
+    for value in set(values):
+        try:
+            object_ids.append(ObjectId(value))
+        except (InvalidId, TypeError):
+            continue
+    return object_ids
+
+
+def cart_currency(currency):
+    """Currency a cart or order is priced in: the preferred one if stored prices exist for it"""
+    return currency if currency in SUPPORTED_CURRENCIES else 'USD'
+
+
+def cart_product_fields(currency):
+    """Cart hydration projection including the stored price in `currency`"""
+    return dict(CART_PRODUCT_FIELDS, **{f'prices.{currency}.amount': 1})
+
+
+def compute_cart_subtotal(cart, products):
+    """Sum cart lines in USD at the products' current prices, as checkout charges them.
+
+    `products` are the cart's hydrated products keyed by string id; lines whose
+    product no longer exists are skipped, as at checkout.
+    """
+    subtotal = 0
+    for item in cart:
+        product = products.get(item['product_id'])
+        if product:
+            subtotal += product['base_price_usd'] * item['quantity']
+    return subtotal
+
+
+def stored_cart_subtotal(cart):
+    """What CART_SUBTOTAL_STAGES stores for `cart`"""
+    return sum(item.get('unit_price_usd', 0) * item['quantity'] for item in cart)
+
+
+def price_cart(cart, products, currency, subtotal=None):
+    """Name and price each line of `cart` in place, returning the GET /cart total.
+
+    `subtotal` is the user's stored cart_subtotal_usd. It is the USD total
+    unless a line's stored price is behind its product's (a line written from
+    a stale catalog cache, or a cart from before the field existed), in which
+    case the lines are summed at current prices, as checkout charges them.
+    """
+    total_local = 0
+    for item in cart:
+        product = products.get(item['product_id'])
+        if item.get('unit_price_usd') != (product['base_price_usd'] if product else 0):
+            subtotal = None
+        if not product:
+            continue
+        item['product_name'] = product['name']
+        item['product_price'] = product['base_price_usd']
+        # Local total from the stored per-currency prices, never converted here
+        price = local_price(product, currency)
+        if price is not None:
+            total_local += price * item['quantity']
+
+    if subtotal is None:
+        subtotal = compute_cart_subtotal(cart, products)
+    return {
+        'usd': round(subtotal, 2),
+        'local': round(total_local, 2),
+        'currency': currency,
+        'symbol': CURRENCY_SYMBOLS.get(currency, '$')
+    }
+
+
+def parse_quantity(value, allow_zero=False):
+    """Validate a cart quantity, raising ValueError if invalid"""
+    if isinstance(value, bool) or not isinstance(value, int) or value < (0 if allow_zero else 1):
+        raise ValueError('quantity must be a positive integer' if not allow_zero
+                         else 'quantity must be a non-negative integer')
+    return value
+
+
+def parse_json_body(data):
+    """Validate a parsed request body (None if missing or malformed), raising ValueError unless it is an object"""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    return data
+
+
+def cart_line(product, quantity):
+    """New cart line, carrying the product's current USD price for the stored subtotal"""
+    return {
+        'product_id': str(product['_id']),
+        'quantity': quantity,
+        'unit_price_usd': product['base_price_usd'],
+        'added_at': datetime.utcnow()
+    }
+
+
+def cart_subtotal_op(user_id):
+    """Statement recomputing the user's stored cart subtotal.
+
+    Every cart bulk_write ends with it, so the subtotal is current as soon as
+    the write returns, whichever writes interleaved with it. It matches the
+    user once, on top of the line statements' own matches.
+    """
+    return UpdateOne({'_id': ObjectId(user_id)}, CART_SUBTOTAL_STAGES)
+
+
+def cart_removal(user_id, product_id):
+    """(filter, update pipeline) that drops a product's line and recomputes the subtotal"""
+    return (
+        {'_id': ObjectId(user_id)},
+        [{'$set': {
+            'cart': {'$filter': {
+                'input': {'$ifNull': ['$cart', []]},
+                'as': 'line',
+                'cond': {'$ne': ['$$line.product_id', product_id]}
+            }},
+            'updated_at': datetime.utcnow()
+        }}] + CART_SUBTOTAL_STAGES
+    )
+
+
+def cart_reprice_ops(product_id, price):
+    """Statements moving every cart line of a product to `price` (0 once it is deleted)"""
+    in_cart = {'cart.product_id': str(product_id)}
+    return [
+        UpdateMany(in_cart, {'$set': {'cart.$.unit_price_usd': price}}),
+        UpdateMany(in_cart, CART_SUBTOTAL_STAGES)
+    ]
+
+
+def cart_line_ops(user_id, product, quantity, increment=False):
+    """Update statements that set (or add to) one cart line, creating it if missing.
+
+    The first statement changes the line in place through the positional
+    operator; the second only matches when the line is absent and pushes it.
+    Sent together in one ordered bulk_write they act as an upsert of the line.
+    Both bring the line to the product's current price.
+    """
+    user_filter = {'_id': ObjectId(user_id)}
+    product_id = str(product['_id'])
+    change = {'$inc': {'cart.$.quantity': quantity}} if increment else {'$set': {'cart.$.quantity': quantity}}
+    change.setdefault('$set', {}).update({
+        'cart.$.unit_price_usd': product['base_price_usd'],
+        'updated_at': datetime.utcnow()
+    })
+    return [
+        UpdateOne(dict(user_filter, **{'cart.product_id': product_id}), change),
+        UpdateOne(
+            dict(user_filter, **{'cart.product_id': {'$ne': product_id}}),
+            {'$push': {'cart': cart_line(product, quantity)}, '$set': {'updated_at': datetime.utcnow()}}
+        )
+    ]
+
+
+def parse_cart_quantities(items, find_product):
+    """Validate PUT /cart/quantities items into {product_id: (quantity, product)}.
+
+    Quantity 0 removes a line, so only the products being set are looked up,
+    with `find_product(product_id)`. Raises ValueError for a malformed item and
+    ProductNotFound for an unknown product. A repeated product keeps its last
+    quantity.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError('items must be a non-empty list')
+    lines = {}
+    for item in items:
+        if not isinstance(item, dict) or not item.get('product_id'):
+            raise ValueError('Each item needs a product_id')
+        quantity = parse_quantity(item.get('quantity'), allow_zero=True)
+        product_id = str(item['product_id'])
+        product = None
+        if quantity:
+            product = find_product(product_id)
+            if not product:
+                raise ProductNotFound(f'Product not found: {product_id}')
+        lines[product_id] = (quantity, product)
+    return lines
+
+
+def cart_quantity_ops(user_id, lines):
+    """Statements applying `lines`, for one ordered bulk_write with cart_subtotal_op.
+
+    Each line's statements match the user exactly once, unless another request
+    changes that line between them, so a matched count below len(lines) + 1
+    means some line may not have landed.
+    """
+    operations = []
+    for product_id, (quantity, product) in lines.items():
+        if quantity == 0:
+            operations.append(UpdateOne(
+                {'_id': ObjectId(user_id)},
+                {'$pull': {'cart': {'product_id': product_id}}, '$set': {'updated_at': datetime.utcnow()}}
+            ))
+        else:
+            operations.extend(cart_line_ops(user_id, product, quantity))
+    return operations
+
+
+def unapplied_cart_lines(cart, lines):
+    """The entries of `lines` whose quantity `cart` does not have (0 meaning no line)"""
+    current = {}
+    for line in cart:
+        current.setdefault(line['product_id'], line['quantity'])
+    return {product_id: line for product_id, line in lines.items() if current.get(product_id, 0) != line[0]}
+
+
+# ========== ORDERS ==========
+def build_order(user_id, cart, products, currency, data):
+    """Order for `cart` at the products' current prices, with local amounts frozen on it"""
+    total_usd = 0
+    total_local = 0
+    order_items = []
+
+    for item in cart:
+        product = products.get(item['product_id'])
+        if product:
+            item_total = product['base_price_usd'] * item['quantity']
+            total_usd += item_total
+
+            price_local = local_price(product, currency) or 0
+            total_local += price_local * item['quantity']
+
+            order_items.append({
+                'product_id': str(product['_id']),
+                'product_name': product['name'],
+                'quantity': item['quantity'],
+                'price_per_item': product['base_price_usd'],
+                'item_total': item_total,
+                'price_local': price_local
+            })
+
+    now = datetime.utcnow()
+    return {
+        '_id': ObjectId(),
+        'order_id': str(uuid.uuid4())[:8].upper(),
+        'user_id': user_id,
+        'items': order_items,
+        'total_usd': total_usd,
+        'currency': currency,
+        'total_local': round(total_local, 2),
+        'shipping_address': data.get('shipping_address', {}),
+        'payment_method': data.get('payment_method', 'card'),
+        'payment_status': 'pending',
+        'order_status': 'processing',
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+def cart_claim(user_id, cart, order):
+    """(filter, update) that empties the user's cart only if it is still `cart`"""
+    return (
+        {'_id': ObjectId(user_id), 'cart': cart},
+        {'$set': {'cart': [], 'cart_subtotal_usd': 0, 'updated_at': order['created_at']}}
+    )
+
+
+def cart_restore(user_id, cart):
+    """(filter, update) putting back a claimed cart whose order could not be saved"""
+    return (
+        {'_id': ObjectId(user_id)},
+        {'$set': {'cart': cart, 'cart_subtotal_usd': stored_cart_subtotal(cart)}}
+    )
+
+
+def placed_order(order):
+    """POST /checkout body for a committed order"""
+    return {
+        'status': 'success',
+        'message': 'Order created successfully',
+        'order_id': order['order_id'],
+        'order_number': str(order['_id']),
+        'total': order['total_usd'],
+        'items_count': len(order['items'])
+    }
+
+
+def order_view(order, preferred_currency):
+    """Add the display currency symbol to an order, in place.
+
+    Orders placed before local totals were stored fall back to today's rate
+    in `preferred_currency`.
+    """
+    if 'total_local' not in order:
+        order['total_local'] = order['total_usd'] * rates.rate('USD', preferred_currency, default=1)
+        order['currency'] = preferred_currency
+
+    order['currency_symbol'] = CURRENCY_SYMBOLS.get(order['currency'], '$')
+    return order
@@ -0,0 +1,20 @@
+"""Production WSGI entry point for a pre-forking server.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py makes every worker import this module itself, after fork,
+so each one builds its own Mongo client, and calls warm_up() before the
+worker accepts its first request. Pool sizes and timeouts come from the
+MONGO_*_POOL_SIZE and MONGO_*_TIMEOUT_MS settings (see mongo_pool.py).
+"""
+import queenkoba_mongodb as api
+
+app = api.app
+
+
+def warm_up():
+    try:
+        api.warm_up()
+    except Exception as e:
+        app.logger.warning('Worker starting cold, MongoDB unavailable: %s', e)
+    api.rate_refresher.start()